@@ -0,0 +1,266 @@
+import math
+import tkinter as tk
+from tkinter import ttk
+
+MAX_CELL_PX = 32
+GRID_MIN_CELL_PX = 6
+
+
+class AllocationMap(ttk.Frame):
+    """Canvas view of a StorageAllocator's blocks, laid out left to right and
+    top to bottom in square cells.
+
+    Used space is drawn from the allocator's run-length extents, each one
+    as at most three rectangles (partial first row, whole rows, partial last
+    row) over a single free-space background, and only for the rows on
+    screen. Runs sharing a cell are skipped, so zoomed out the work is
+    bounded by the cells shown, not the blocks behind them. refresh()
+    redraws just the rows touched by the ranges the allocator reports
+    through take_changes(). Zooming goes from the whole volume in one view
+    (many blocks per pixel) to one block per MAX_CELL_PX-wide cell.
+    """
+
+    def __init__(self, master, storage, colors, **kwargs):
+        super().__init__(master, **kwargs)
+        self.storage = storage
+        self.colors = colors
+        self.canvas = tk.Canvas(self, background=colors['background'], highlightthickness=0)
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        self.scroll = ttk.Scrollbar(self, command=self.yview)
+        self.scroll.grid(row=0, column=1, sticky="ns")
+        self.info = ttk.Label(self, text="")
+        self.info.grid(row=1, column=0, columnspan=2, sticky="ew", pady=(4, 0))
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+
+        self.cell = 1      # pixels per cell side
+        self.per_cell = 1  # blocks per cell
+        self.top = 0       # first row on screen
+        self.fitted = False
+        self.width = self.height = 0
+
+        self.canvas.bind('<Configure>', self.on_resize)
+        self.canvas.bind('<Motion>', self.on_motion)
+        self.canvas.bind('<MouseWheel>', lambda e: self.on_wheel(e, -1 if e.delta > 0 else 1))
+        self.canvas.bind('<Button-4>', lambda e: self.on_wheel(e, -1))
+        self.canvas.bind('<Button-5>', lambda e: self.on_wheel(e, 1))
+
+    # === Geometry ===
+    @property
+    def columns(self):
+        return max(1, self.width // self.cell)
+
+    @property
+    def visible_rows(self):
+        return max(1, self.height // self.cell)
+
+    @property
+    def rows(self):
+        cells = -(-self.storage.size // self.per_cell)
+        return -(-cells // self.columns)
+
+    def row_blocks(self):
+        return self.columns * self.per_cell
+
+    def block_at(self, x, y):
+        """Block shown at canvas pixel (x, y), or None past the volume"""
+        col, row = int(x) // self.cell, self.top + int(y) // self.cell
+        if col >= self.columns:
+            return None
+        block = (row * self.columns + col) * self.per_cell
+        return block if 0 <= block < self.storage.size else None
+
+    # === Zoom and scrolling ===
+    def fit(self):
+        """Zoom out to show the whole volume"""
+        size, area = self.storage.size, self.width * self.height
+        if not area:
+            return
+        self.per_cell, self.top = 1, 0
+        if size <= area:
+            self.cell = max(1, min(MAX_CELL_PX, math.isqrt(area // max(size, 1))))
+            while self.cell > 1 and self.rows > self.visible_rows:
+                self.cell -= 1
+        else:
+            self.cell = 1
+            self.per_cell = -(-size // area)
+            while self.rows > self.visible_rows:
+                self.per_cell += 1
+        self.fitted = True
+        self.redraw()
+
+    def zoom(self, step, anchor=None):
+        """Zoom in (step > 0) or out by a factor of two, keeping the block
+        under `anchor` (x, y) where it is"""
+        x, y = anchor if anchor else (0, 0)
+        block = self.block_at(x, y)
+        if block is None:
+            block = self.top * self.row_blocks()
+        if step > 0:
+            if self.per_cell > 1:
+                self.per_cell = max(1, self.per_cell // 2)
+            elif self.cell < MAX_CELL_PX:
+                self.cell = min(MAX_CELL_PX, self.cell * 2)
+            else:
+                return
+        else:
+            if self.rows <= self.visible_rows:
+                return  # the whole volume is already in view
+            if self.cell > 1:
+                self.cell //= 2
+            else:
+                self.per_cell *= 2
+        self.top = block // self.row_blocks() - int(y) // self.cell
+        self.redraw()
+
+    def yview(self, *args):
+        """Scrollbar protocol: ('moveto', fraction) or ('scroll', n, 'units'|'pages')"""
+        if args[0] == 'moveto':
+            self.top = int(float(args[1]) * self.rows)
+        elif args[0] == 'scroll':
+            self.top += int(args[1]) * (self.visible_rows if args[2] == 'pages' else 1)
+        self.redraw()
+
+    def on_wheel(self, event, direction):
+        if event.state & 0x4:  # Control: zoom around the pointer
+            self.zoom(-direction, (event.x, event.y))
+        else:
+            self.yview('scroll', direction * 3, 'units')
+
+    def on_resize(self, event):
+        self.width, self.height = event.width, event.height
+        if self.fitted:
+            self.redraw()
+        else:
+            self.fit()
+
+    def on_motion(self, event):
+        block = self.block_at(event.x, event.y)
+        if block is None:
+            self.show_info()
+            return
+        last = min(block + self.per_cell, self.storage.size) - 1
+        span = f"Block {block:,}" if last == block else f"Blocks {block:,}–{last:,}"
+        used = any(True for _ in self.storage.used_runs(block, last + 1))
+        self.show_info(f"{span}: {'used' if used else 'free'}")
+
+    def show_info(self, pointer=""):
+        first = self.top * self.row_blocks()
+        last = min(self.storage.size, (self.top + self.visible_rows) * self.row_blocks()) - 1
+        scale = (f"{self.per_cell:,} blocks per cell" if self.per_cell > 1
+                 else f"{self.cell}px per block")
+        text = f"Showing blocks {first:,}–{max(first, last):,} of {self.storage.size:,} ({scale})"
+        self.info.config(text=f"{text} · {pointer}" if pointer else text)
+
+    # === Drawing ===
+    def redraw(self):
+        """Draw everything on screen from scratch"""
+        if not self.width or not self.height:
+            return
+        self.top = max(0, min(self.top, self.rows - self.visible_rows))
+        self.storage.take_changes()
+        self.canvas.delete('all')
+        self._draw_free()
+        self._draw_rows(self.top, self.top + self.visible_rows - 1)
+        self._draw_grid()
+        rows = max(self.rows, 1)
+        self.scroll.set(self.top / rows, min(1.0, (self.top + self.visible_rows) / rows))
+        self.show_info()
+
+    def refresh(self):
+        """Redraw only the on-screen rows touched since the last draw"""
+        if not self.width or not self.height:
+            return
+        first, last = self.top, self.top + self.visible_rows - 1
+        row_blocks = self.row_blocks()
+        for start, end in self.storage.take_changes():
+            r0, r1 = max(first, start // row_blocks), min(last, (end - 1) // row_blocks)
+            if r0 <= r1:
+                self._redraw_rows(r0, r1)
+        self.canvas.tag_raise('grid')
+
+    def _redraw_rows(self, r0, r1):
+        # Extents drawn across more rows than changed must go and be redrawn
+        # whole, so widen the range until no 'used' item sticks out of it
+        while True:
+            y0, y1 = (r0 - self.top) * self.cell, (r1 - self.top + 1) * self.cell
+            items = [item for item in self.canvas.find_overlapping(0, y0 + 0.25, self.width, y1 - 0.25)
+                     if 'used' in self.canvas.gettags(item)]
+            lo, hi = r0, r1
+            for item in items:
+                _, iy0, _, iy1 = self.canvas.coords(item)
+                lo = min(lo, self.top + int(iy0) // self.cell)
+                hi = max(hi, self.top + math.ceil(iy1 / self.cell) - 1)
+            if (lo, hi) == (r0, r1):
+                break
+            r0, r1 = lo, hi
+        self.canvas.delete(*items)
+        self._draw_rows(r0, r1)
+
+    def _draw_free(self):
+        cells = -(-self.storage.size // self.per_cell)
+        last_row = (cells - 1) // self.columns
+        bottom = min(last_row, self.top + self.visible_rows - 1)
+        full_rows_end = min(bottom + 1, last_row)
+        if full_rows_end > self.top:
+            self._rect(0, self.top, self.columns, full_rows_end, 'free')
+        if self.top <= last_row <= bottom:
+            self._rect(0, last_row, cells - last_row * self.columns, last_row + 1, 'free')
+
+    def _draw_rows(self, r0, r1):
+        """Draw the used extents within rows [r0, r1]"""
+        row_blocks = self.row_blocks()
+        start_block, end_block = r0 * row_blocks, (r1 + 1) * row_blocks
+        span = None  # [first cell, last cell] of consecutive used cells
+        pos = start_block
+        while pos < end_block:
+            # Only the first used run from `pos` matters: the rest of its last
+            # cell is used whatever it holds, so the search goes on from the
+            # next cell and a row costs at most one lookup per cell
+            run = next(iter(self.storage.used_runs(pos, end_block)), None)
+            if run is None:
+                break
+            start, length = run
+            c0, c1 = start // self.per_cell, (start + length - 1) // self.per_cell
+            pos = (c1 + 1) * self.per_cell
+            if span and c0 <= span[1] + 1:
+                span[1] = c1
+                continue
+            if span:
+                self._draw_cells(*span, r0, r1)
+            span = [c0, c1]
+        if span:
+            self._draw_cells(*span, r0, r1)
+
+    def _draw_cells(self, c0, c1, r0, r1):
+        columns = self.columns
+        ra, rb = c0 // columns, c1 // columns
+        if ra < r0:
+            c0, ra = r0 * columns, r0
+        if rb > r1:
+            c1, rb = (r1 + 1) * columns - 1, r1
+        if ra == rb:
+            self._rect(c0 % columns, ra, c1 % columns + 1, ra + 1, 'used')
+            return
+        self._rect(c0 % columns, ra, columns, ra + 1, 'used')
+        if rb - ra > 1:
+            self._rect(0, ra + 1, columns, rb, 'used')
+        self._rect(0, rb, c1 % columns + 1, rb + 1, 'used')
+
+    def _rect(self, col0, row0, col1, row1, tag):
+        y0, y1 = (row0 - self.top) * self.cell, (row1 - self.top) * self.cell
+        self.canvas.create_rectangle(col0 * self.cell, y0, col1 * self.cell, y1, width=0, tags=tag,
+                                     fill=self.colors['accent'] if tag == 'used' else self.colors['secondary'])
+
+    def _draw_grid(self):
+        """Cell borders, once cells are large enough to tell blocks apart"""
+        if self.cell < GRID_MIN_CELL_PX:
+            return
+        rows = min(self.visible_rows, self.rows - self.top)
+        width, height = self.columns * self.cell, rows * self.cell
+        for col in range(self.columns + 1):
+            self.canvas.create_line(col * self.cell, 0, col * self.cell, height,
+                                    fill=self.colors['background'], tags='grid')
+        for row in range(rows + 1):
+            self.canvas.create_line(0, row * self.cell, width, row * self.cell,
+                                    fill=self.colors['background'], tags='grid')
@@ -0,0 +1,520 @@
+from bisect import bisect_left, insort
+import random
+import re
+
+# One bit per block, block i at bit (i & 7) of byte (i >> 3).
+_NOT_FREE_BYTE = re.compile(rb'[^\x00]')
+_NOT_USED_BYTE = re.compile(rb'[^\xff]')
+_MAP_CHARS = [''.join('X' if byte >> bit & 1 else '.' for bit in range(8)) for byte in range(256)]
+
+
+def _find_bit(bitmap, pos, end, value):
+    """Position of the first bit equal to `value` in [pos, end), or `end`"""
+    if pos >= end:
+        return end
+    byte = pos >> 3
+    bits = bitmap[byte] if value else ~bitmap[byte] & 0xFF
+    bits >>= pos & 7
+    if bits:
+        return min(pos + (bits & -bits).bit_length() - 1, end)
+    # Whole bytes of the other value are skipped by the regex engine
+    pattern = _NOT_FREE_BYTE if value else _NOT_USED_BYTE
+    match = pattern.search(bitmap, byte + 1, (end + 7) >> 3)
+    if match is None:
+        return end
+    byte = match.start()
+    bits = bitmap[byte] if value else ~bitmap[byte] & 0xFF
+    return min((byte << 3) + (bits & -bits).bit_length() - 1, end)
+
+
+def _runs(bitmap, start, end, value):
+    """Yield (start, length) for each run of bits equal to `value` in [start, end)"""
+    pos = _find_bit(bitmap, start, end, value)
+    while pos < end:
+        stop = _find_bit(bitmap, pos, end, not value)
+        yield pos, stop - pos
+        pos = _find_bit(bitmap, stop, end, value)
+
+
+def _fill(bitmap, start, end, value):
+    if start >= end:
+        return
+    first, last = start >> 3, (end - 1) >> 3
+    head = (0xFF << (start & 7)) & 0xFF
+    tail = 0xFF >> (7 - ((end - 1) & 7))
+    if first == last:
+        head &= tail
+    elif value:
+        bitmap[first + 1:last] = b'\xff' * (last - first - 1)
+        bitmap[last] |= tail
+    else:
+        bitmap[first + 1:last] = bytes(last - first - 1)
+        bitmap[last] &= ~tail & 0xFF
+    if value:
+        bitmap[first] |= head
+    else:
+        bitmap[first] &= ~head & 0xFF
+
+
+class _Extent:
+    __slots__ = ('start', 'length', 'priority', 'left', 'right', 'max_length')
+
+    def __init__(self, start, length):
+        self.start = start
+        self.length = length
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.max_length = length
+
+
+def _update(node):
+    best = node.length
+    if node.left is not None and node.left.max_length > best:
+        best = node.left.max_length
+    if node.right is not None and node.right.max_length > best:
+        best = node.right.max_length
+    node.max_length = best
+
+
+def _split(node, key):
+    """Split a treap into extents starting before `key` and the rest"""
+    if node is None:
+        return None, None
+    if node.start < key:
+        left, right = _split(node.right, key)
+        node.right = left
+        _update(node)
+        return node, right
+    left, right = _split(node.left, key)
+    node.left = right
+    _update(node)
+    return left, node
+
+
+def _merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+def _leftmost_fit(node, size):
+    while node is not None and node.max_length >= size:
+        if node.left is not None and node.left.max_length >= size:
+            node = node.left
+        elif node.length >= size:
+            return node.start
+        else:
+            node = node.right
+    return -1
+
+
+class FreeExtentIndex:
+    """Free extents ordered by start, in a treap augmented with the
+    largest extent length of each subtree so first-fit is O(log n)."""
+
+    def __init__(self, size=0):
+        self.root = None
+        self.lengths = {}
+        self.starts_by_end = {}
+        if size > 0:
+            self.insert(0, size)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __iter__(self):
+        stack, node = [], self.root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.start, node.length
+            node = node.right
+
+    def largest(self):
+        return self.root.max_length if self.root is not None else 0
+
+    def insert(self, start, length):
+        left, right = _split(self.root, start)
+        self.root = _merge(_merge(left, _Extent(start, length)), right)
+        self.lengths[start] = length
+        self.starts_by_end[start + length] = start
+
+    def remove(self, start):
+        length = self.lengths.pop(start)
+        del self.starts_by_end[start + length]
+        left, right = _split(self.root, start)
+        _, right = _split(right, start + 1)
+        self.root = _merge(left, right)
+        return length
+
+    def first_fit(self, size, lo=0):
+        """Start of the lowest extent at or after `lo` holding `size` blocks, or -1"""
+        if lo <= 0:
+            return _leftmost_fit(self.root, size)
+        left, right = _split(self.root, lo)
+        found = _leftmost_fit(right, size)
+        self.root = _merge(left, right)
+        return found
+
+    def take(self, start, size):
+        """Carve `size` blocks off the front of the extent beginning at `start`"""
+        length = self.remove(start)
+        if length > size:
+            self.insert(start + size, length - size)
+
+    def release(self, start, length):
+        """Return a run of blocks to the index, merging it with its neighbours"""
+        before = self.starts_by_end.get(start)
+        if before is not None:
+            length += start - before
+            self.remove(before)
+            start = before
+        after = self.lengths.get(start + length)
+        if after is not None:
+            self.remove(start + length)
+            length += after
+        self.insert(start, length)
+
+
+class PlacementStrategy:
+    """Chooses where a request lands. Strategies only see free space: the
+    allocator hands them every run of blocks that becomes free."""
+    name = None
+
+    def allocate(self, size):
+        raise NotImplementedError
+
+    def release(self, start, length):
+        raise NotImplementedError
+
+    def largest_free(self):
+        raise NotImplementedError
+
+    def free_extents(self):
+        """Sorted (start, length) of the free space as the strategy holds it;
+        releasing them into a fresh instance rebuilds the same state"""
+        raise NotImplementedError
+
+    def extent_count(self):
+        """len(free_extents()), without building them"""
+        raise NotImplementedError
+
+    def reserved_size(self, size):
+        return size
+
+
+class FirstFit(PlacementStrategy):
+    name = "First Fit"
+
+    def __init__(self):
+        self.extents = FreeExtentIndex()
+
+    def allocate(self, size):
+        start = self.extents.first_fit(size)
+        if start != -1:
+            self.extents.take(start, size)
+        return start
+
+    def release(self, start, length):
+        self.extents.release(start, length)
+
+    def largest_free(self):
+        return self.extents.largest()
+
+    def free_extents(self):
+        return sorted(self.extents.lengths.items())
+
+    def extent_count(self):
+        return len(self.extents)
+
+
+class NextFit(FirstFit):
+    name = "Next Fit"
+
+    def __init__(self):
+        super().__init__()
+        self.rover = 0
+
+    def allocate(self, size):
+        start = self.extents.first_fit(size, self.rover)
+        if start == -1:
+            start = self.extents.first_fit(size)
+        if start != -1:
+            self.extents.take(start, size)
+            self.rover = start + size
+        return start
+
+
+class _SizeBucketedFit(PlacementStrategy):
+    """Free extents kept in power-of-two size classes, each a list sorted by
+    (length, start), so a fit is found without walking every extent."""
+
+    def __init__(self):
+        self.buckets = [[] for _ in range(65)]
+        self.lengths = {}
+        self.starts_by_end = {}
+
+    def _insert(self, start, length):
+        insort(self.buckets[length.bit_length()], (length, start))
+        self.lengths[start] = length
+        self.starts_by_end[start + length] = start
+
+    def _remove(self, start):
+        length = self.lengths.pop(start)
+        del self.starts_by_end[start + length]
+        bucket = self.buckets[length.bit_length()]
+        del bucket[bisect_left(bucket, (length, start))]
+        return length
+
+    def _pick(self, size):
+        raise NotImplementedError
+
+    def allocate(self, size):
+        start = self._pick(size)
+        if start != -1:
+            length = self._remove(start)
+            if length > size:
+                self._insert(start + size, length - size)
+        return start
+
+    def release(self, start, length):
+        before = self.starts_by_end.get(start)
+        if before is not None:
+            length += start - before
+            self._remove(before)
+            start = before
+        after = self.lengths.get(start + length)
+        if after is not None:
+            self._remove(start + length)
+            length += after
+        self._insert(start, length)
+
+    def largest_free(self):
+        for bucket in reversed(self.buckets):
+            if bucket:
+                return bucket[-1][0]
+        return 0
+
+    def free_extents(self):
+        return sorted(self.lengths.items())
+
+    def extent_count(self):
+        return len(self.lengths)
+
+
+class BestFit(_SizeBucketedFit):
+    name = "Best Fit"
+
+    def _pick(self, size):
+        first = size.bit_length()
+        bucket = self.buckets[first]
+        i = bisect_left(bucket, (size, -1))
+        if i < len(bucket):
+            return bucket[i][1]
+        for bucket in self.buckets[first + 1:]:
+            if bucket:
+                return bucket[0][1]
+        return -1
+
+
+class WorstFit(_SizeBucketedFit):
+    name = "Worst Fit"
+
+    def _pick(self, size):
+        for bucket in reversed(self.buckets):
+            if bucket:
+                length = bucket[-1][0]
+                if length < size:
+                    return -1
+                return bucket[bisect_left(bucket, (length, -1))][1]
+        return -1
+
+
+class BuddySystem(PlacementStrategy):
+    """Power-of-two buddy allocator. Requests are rounded up to the next
+    power of two and freed blocks merge with their buddy when it is free."""
+    name = "Buddy System"
+
+    def __init__(self):
+        self.free = [[] for _ in range(65)]
+
+    def reserved_size(self, size):
+        return 1 << (size - 1).bit_length()
+
+    def allocate(self, size):
+        order = (size - 1).bit_length()
+        for found in range(order, len(self.free)):
+            if self.free[found]:
+                start = self.free[found].pop(0)
+                while found > order:
+                    found -= 1
+                    insort(self.free[found], start + (1 << found))
+                return start
+        return -1
+
+    def release(self, start, length):
+        end = start + length
+        while start < end:
+            order = (end - start).bit_length() - 1
+            if start:
+                order = min(order, (start & -start).bit_length() - 1)
+            self._free_block(start, order)
+            start += 1 << order
+
+    def _free_block(self, start, order):
+        while order + 1 < len(self.free):
+            buddy = start ^ (1 << order)
+            blocks = self.free[order]
+            i = bisect_left(blocks, buddy)
+            if i == len(blocks) or blocks[i] != buddy:
+                break
+            del blocks[i]
+            start = min(start, buddy)
+            order += 1
+        insort(self.free[order], start)
+
+    def largest_free(self):
+        for order in range(len(self.free) - 1, -1, -1):
+            if self.free[order]:
+                return 1 << order
+        return 0
+
+    def free_extents(self):
+        return sorted((start, 1 << order) for order, blocks in enumerate(self.free) for start in blocks)
+
+    def extent_count(self):
+        return sum(len(blocks) for blocks in self.free)
+
+
+STRATEGIES = {cls.name: cls for cls in (FirstFit, NextFit, BestFit, WorstFit, BuddySystem)}
+
+
+class StorageAllocator:
+    # Past this many unread changed ranges they collapse into one span
+    MAX_CHANGES = 4096
+
+    def __init__(self, size=100, strategy=FirstFit.name):
+        self.size = size
+        self.bitmap = bytearray((size + 7) >> 3)
+        self.used = 0
+        self.changes = []  # [start, end) ranges touched since take_changes()
+        self.set_strategy(strategy)
+
+    def set_strategy(self, name):
+        """Switch placement policy, seeding it with the current free space:
+        the old strategy's extents, or a scan of the bitmap if there is none"""
+        old = getattr(self, 'strategy', None)
+        self._seed(name, self.free_runs() if old is None else old.free_extents())
+
+    def _seed(self, name, extents):
+        self.strategy = STRATEGIES[name]()
+        for start, length in extents:
+            self.strategy.release(start, length)
+
+    def free_runs(self, start=0, end=None):
+        return _runs(self.bitmap, start, self.size if end is None else min(end, self.size), False)
+
+    def used_runs(self, start=0, end=None):
+        return _runs(self.bitmap, start, self.size if end is None else min(end, self.size), True)
+
+    def _note_change(self, start, end):
+        self.changes.append((start, end))
+        if len(self.changes) > self.MAX_CHANGES:
+            self.changes = [(min(s for s, _ in self.changes), max(e for _, e in self.changes))]
+
+    def take_changes(self):
+        """Sorted, merged [start, end) ranges allocated or freed since the last
+        call, for views that redraw only what changed"""
+        merged = []
+        for start, end in sorted(self.changes):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        self.changes = []
+        return merged
+
+    def reserved_size(self, size):
+        return self.strategy.reserved_size(size)
+
+    def free_blocks(self):
+        return self.size - self.used
+
+    def largest_free_extent(self):
+        return self.strategy.largest_free()
+
+    def external_fragmentation(self):
+        """Share of free space unusable by a request as large as all of it"""
+        free = self.free_blocks()
+        return 1 - self.largest_free_extent() / free if free else 0.0
+
+    def allocate(self, size):
+        if size <= 0 or size > self.strategy.largest_free():
+            return -1
+        start = self.strategy.allocate(size)
+        if start != -1:
+            reserved = self.strategy.reserved_size(size)
+            self._set_blocks(start, start + reserved, True, self.used + reserved)
+        return start
+
+    # Kept for callers written against the first-fit-only allocator; placement
+    # follows whichever strategy is active (first fit unless changed).
+    first_fit_allocate = allocate
+
+    def deallocate(self, start, size):
+        start, end = max(start, 0), min(start + size, self.size)
+        used = self.used
+        for run_start, length in list(_runs(self.bitmap, start, end, True)):
+            self.strategy.release(run_start, length)
+            used -= length
+        if start < end:
+            self._set_blocks(start, end, False, used)
+
+    def allocate_many(self, sizes):
+        """allocate() each of `sizes` in order; the list of starts, -1 where
+        it failed. Nothing frees in between, so once a size fails no larger
+        one is tried."""
+        starts = []
+        smallest_failed = None
+        for size in sizes:
+            if smallest_failed is not None and size >= smallest_failed:
+                starts.append(-1)
+                continue
+            start = self.allocate(size)
+            if start == -1 and size > 0:
+                smallest_failed = size
+            starts.append(start)
+        return starts
+
+    def free_many(self, extents):
+        """deallocate() each (start, size), merging touching extents first so
+        every run is released to the strategy and cleared once"""
+        merged = []
+        for start, size in sorted(extents):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], start + size)
+            else:
+                merged.append([start, start + size])
+        for start, end in merged:
+            self.deallocate(start, end - start)
+
+    def _set_blocks(self, start, end, value, used):
+        """Mark [start, end) used or free, leaving `used` blocks in use. The
+        one place the block map changes, so backends can hook it."""
+        _fill(self.bitmap, start, end, value)
+        self.used = used
+        self._note_change(start, end)
+
+    def get_allocation_map(self):
+        return ''.join(map(_MAP_CHARS.__getitem__, self.bitmap))[:self.size]
@@ -0,0 +1,293 @@
+"""Benchmark StorageAllocator by replaying allocate/deallocate traces.
+
+    python allocator_bench.py --blocks 100 100000 10000000 --strategy "First Fit"
+    python allocator_bench.py --trace-file recorded.trace --output results.jsonl
+    python allocator_bench.py --blocks 1000000 --threads 1 2 4 8 --batch 16
+
+Each run prints one JSON object per line (trace x strategy x volume size)
+with throughput, latency percentiles, peak memory and fragmentation samples.
+
+With --threads, ShardedStorageAllocator is stress-tested instead: every
+thread allocates and frees random extents for its share of --ops, marking
+each block it gets with its own id, and the run reports throughput per
+thread count plus any block handed to two threads at once.
+
+Trace files hold one operation per line: `a <id> <size>` allocates `size`
+blocks under `id`, `f <id>` frees whatever `id` was given. Blank lines and
+lines starting with `#` are ignored.
+"""
+import argparse
+from array import array
+import json
+import platform
+import random
+import sys
+import threading
+import time
+import tracemalloc
+
+from allocator import STRATEGIES, FirstFit, StorageAllocator
+from sharded_allocator import ShardedStorageAllocator
+
+WORKLOADS = ('uniform', 'heavy-tailed', 'churn')
+
+
+def generate_trace(workload, blocks, ops, seed=0, max_size=None):
+    """Synthetic trace of `ops` operations sized for a volume of `blocks`"""
+    rng = random.Random(seed)
+    max_size = max_size or max(1, blocks // 100)
+    free_chance = {'uniform': 0.3, 'heavy-tailed': 0.3, 'churn': 0.5}[workload]
+    live = []
+    trace = []
+    next_id = 0
+    for _ in range(ops):
+        if live and rng.random() < free_chance:
+            # Free a random survivor, not the newest, so holes open everywhere
+            i = rng.randrange(len(live))
+            live[i], live[-1] = live[-1], live[i]
+            trace.append(('f', live.pop()))
+            continue
+        if workload == 'heavy-tailed':
+            size = min(max_size, int(rng.paretovariate(1.2)))
+        elif workload == 'churn':
+            size = rng.randint(1, max(1, max_size // 4))
+        else:
+            size = rng.randint(1, max_size)
+        trace.append(('a', next_id, size))
+        live.append(next_id)
+        next_id += 1
+    return trace
+
+
+def read_trace(path):
+    trace = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+            if fields[0] == 'a':
+                trace.append(('a', fields[1], int(fields[2])))
+            elif fields[0] == 'f':
+                trace.append(('f', fields[1]))
+            else:
+                raise ValueError(f"{path}: unknown trace operation {fields[0]!r}")
+    return trace
+
+
+def write_trace(trace, path):
+    with open(path, 'w') as f:
+        for op in trace:
+            f.write(' '.join(map(str, op)) + '\n')
+
+
+def replay(allocator, trace, sample_every=0):
+    """Run a trace against `allocator`, timing every allocator call"""
+    clock = time.perf_counter_ns
+    latencies = array('q')
+    live = {}
+    failed = 0
+    samples = []
+    for n, op in enumerate(trace):
+        if op[0] == 'a':
+            began = clock()
+            start = allocator.allocate(op[2])
+            latencies.append(clock() - began)
+            if start == -1:
+                failed += 1
+            else:
+                live[op[1]] = (start, allocator.reserved_size(op[2]))
+        else:
+            extent = live.pop(op[1], None)
+            if extent is not None:
+                began = clock()
+                allocator.deallocate(*extent)
+                latencies.append(clock() - began)
+        if sample_every and n % sample_every == 0:
+            samples.append({
+                'op': n,
+                'free_blocks': allocator.free_blocks(),
+                'largest_free_extent': allocator.largest_free_extent(),
+                'external_fragmentation': round(allocator.external_fragmentation(), 6),
+            })
+    return latencies, failed, samples
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def peak_memory(blocks, strategy, trace):
+    """Peak bytes allocated by Python while building the volume and replaying"""
+    tracemalloc.start()
+    try:
+        replay(StorageAllocator(blocks, strategy), trace)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(name, trace, blocks, strategy, sample_every, measure_memory=True):
+    allocator = StorageAllocator(blocks, strategy)
+    latencies, failed, samples = replay(allocator, trace, sample_every)
+    ordered = sorted(latencies)
+    elapsed = sum(ordered)
+    return {
+        'trace': name,
+        'strategy': strategy,
+        'blocks': blocks,
+        'ops': len(ordered),
+        'failed_allocations': failed,
+        'ops_per_sec': round(len(ordered) / (elapsed / 1e9), 1) if elapsed else None,
+        'latency_ns': {
+            'p50': percentile(ordered, 0.50),
+            'p99': percentile(ordered, 0.99),
+            'max': ordered[-1] if ordered else 0,
+        },
+        'peak_memory_bytes': peak_memory(blocks, strategy, trace) if measure_memory else None,
+        'final': {
+            'free_blocks': allocator.free_blocks(),
+            'largest_free_extent': allocator.largest_free_extent(),
+            'external_fragmentation': round(allocator.external_fragmentation(), 6),
+        },
+        'samples': samples,
+    }
+
+
+def stress(blocks, strategy, threads, ops, shards=None, batch=1, max_size=None, seed=0):
+    """Hammer a ShardedStorageAllocator from `threads` threads, `ops` calls
+    (allocations and frees, counting each batch item) in all; one shard per
+    thread unless `shards` is given"""
+    allocator = ShardedStorageAllocator(blocks, strategy, shards or threads)
+    max_size = max_size or max(1, blocks // 1000)
+    owner = bytearray(blocks)  # id of the thread holding each block, 0 if free
+    results = [None] * threads
+    ready = threading.Barrier(threads + 1)
+
+    def worker(n):
+        rng = random.Random(seed * 1000 + n)
+        mark = bytes([n % 255 + 1])
+        live = []
+        conflicts = failed = done = 0
+        ready.wait()
+        while done < ops // threads:
+            if live and rng.random() < 0.5:
+                extents = [live.pop(rng.randrange(len(live))) for _ in range(min(batch, len(live)))]
+                for start, size in extents:  # clear before freeing: the blocks may be reused at once
+                    owner[start:start + size] = bytes(size)
+                if batch > 1:
+                    allocator.free_many(extents)
+                else:
+                    allocator.deallocate(*extents[0])
+                done += len(extents)
+                continue
+            sizes = [rng.randint(1, max_size) for _ in range(batch)]
+            starts = allocator.allocate_many(sizes) if batch > 1 else [allocator.allocate(sizes[0])]
+            for start, size in zip(starts, sizes):
+                if start == -1:
+                    failed += 1
+                    continue
+                size = allocator.reserved_size(size)
+                if owner[start:start + size].count(0) != size:
+                    conflicts += 1
+                owner[start:start + size] = mark * size
+                live.append((start, size))
+            done += len(sizes)
+        results[n] = (live, conflicts, failed, done)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    ready.wait()
+    began = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - began
+
+    # Afterwards, survivors must not overlap and must be exactly what is in use
+    live = sorted(extent for result in results for extent in result[0])
+    overlaps = sum(1 for (s1, n1), (s2, _) in zip(live, live[1:]) if s1 + n1 > s2)
+    done = sum(result[3] for result in results)
+    return {
+        'strategy': strategy,
+        'blocks': blocks,
+        'threads': threads,
+        'shards': len(allocator.shards),
+        'batch': batch,
+        'ops': done,
+        'ops_per_sec': round(done / elapsed, 1) if elapsed else None,
+        'failed_allocations': sum(result[2] for result in results),
+        'double_allocations': sum(result[1] for result in results) + overlaps,
+        'consistent': allocator.used == sum(size for _, size in live),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay allocation traces against StorageAllocator.")
+    parser.add_argument('--blocks', type=int, nargs='+', default=[100, 10_000, 1_000_000],
+                        help="volume sizes to benchmark")
+    parser.add_argument('--strategy', action='append', choices=list(STRATEGIES),
+                        help="placement strategy (repeatable, default First Fit)")
+    parser.add_argument('--workload', action='append', choices=WORKLOADS,
+                        help="synthetic workload (repeatable, default all)")
+    parser.add_argument('--trace-file', action='append', default=[],
+                        help="recorded trace to replay (repeatable)")
+    parser.add_argument('--ops', type=int, default=20_000, help="operations per synthetic trace")
+    parser.add_argument('--max-size', type=int, help="largest synthetic request (default blocks/100)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--samples', type=int, default=100,
+                        help="fragmentation samples taken over each run")
+    parser.add_argument('--save-traces', metavar='PREFIX',
+                        help="also write each synthetic trace to PREFIX-<workload>-<blocks>.trace")
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc pass")
+    parser.add_argument('--threads', type=int, nargs='+',
+                        help="stress-test ShardedStorageAllocator with these thread counts instead")
+    parser.add_argument('--shards', type=int, help="shards for --threads (default one per thread)")
+    parser.add_argument('--batch', type=int, default=1,
+                        help="requests per allocate_many/free_many call for --threads")
+    parser.add_argument('--label', default='', help="free-form tag stored with every result")
+    parser.add_argument('--output', help="append JSON lines here instead of stdout")
+    args = parser.parse_args(argv)
+
+    strategies = args.strategy or [FirstFit.name]
+    workloads = args.workload or ([] if args.trace_file else list(WORKLOADS))
+    recorded = [(path, read_trace(path)) for path in args.trace_file]
+    meta = {
+        'label': args.label,
+        'python': platform.python_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+    out = open(args.output, 'a') if args.output else sys.stdout
+    try:
+        if args.threads:
+            for blocks in args.blocks:
+                for strategy in strategies:
+                    for threads in args.threads:
+                        result = stress(blocks, strategy, threads, args.ops, args.shards, args.batch,
+                                        args.max_size, args.seed)
+                        out.write(json.dumps({**meta, **result}) + '\n')
+                        out.flush()
+            return
+        for blocks in args.blocks:
+            traces = list(recorded)
+            for workload in workloads:
+                trace = generate_trace(workload, blocks, args.ops, args.seed, args.max_size)
+                if args.save_traces:
+                    write_trace(trace, f"{args.save_traces}-{workload}-{blocks}.trace")
+                traces.append((workload, trace))
+            for name, trace in traces:
+                sample_every = max(1, len(trace) // args.samples) if args.samples else 0
+                for strategy in strategies:
+                    result = run(name, trace, blocks, strategy, sample_every, not args.no_memory)
+                    out.write(json.dumps({**meta, **result}) + '\n')
+                    out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
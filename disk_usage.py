@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def format_size(size):
+    for unit in ('bytes', 'KB', 'MB', 'GB', 'TB'):
+        if size < 1024 or unit == 'TB':
+            return f"{size:,} {unit}" if unit == 'bytes' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class Usage:
+    __slots__ = ('bytes', 'disk_bytes', 'files', 'dirs', 'errors')
+
+    def __init__(self, size=0, disk_bytes=0, files=0, dirs=0, errors=0):
+        self.bytes = size
+        self.disk_bytes = disk_bytes
+        self.files = files
+        self.dirs = dirs
+        self.errors = errors
+
+    def add(self, other):
+        self.bytes += other.bytes
+        self.disk_bytes += other.disk_bytes
+        self.files += other.files
+        self.dirs += other.dirs
+        self.errors += other.errors
+
+    def copy(self):
+        return Usage(self.bytes, self.disk_bytes, self.files, self.dirs, self.errors)
+
+
+class _OwnEntries:
+    """What one directory holds directly. Files with several hard links are
+    kept apart so a walk can count each inode once."""
+    __slots__ = ('usage', 'linked', 'subdirs')
+
+    def __init__(self):
+        self.usage = Usage(dirs=1)
+        self.linked = []   # ((st_dev, st_ino), size, disk bytes)
+        self.subdirs = []
+
+
+class DiskUsage:
+    """Recursive size aggregation ("du") on a thread pool, one task per
+    directory, built on os.scandir and lstat so symlinks are not followed.
+
+    Every walk stats every file: writing to a file in place leaves its
+    directory's mtime alone, so nothing short of the file's own stat says
+    its size changed. Recursive totals from the last walk are kept for the
+    Treeview's size column.
+    """
+
+    def __init__(self, workers=8, capacity=200_000, progress_interval=0.1):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='du')
+        self.capacity = capacity
+        self.progress_interval = progress_interval
+        self.recursive = OrderedDict()  # dir -> Usage of its whole subtree
+        self.lock = threading.Lock()
+
+    def _visit(self, path):
+        own = _OwnEntries()
+        usage = own.usage
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        own.subdirs.append(entry.name)
+                        continue
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    usage.errors += 1
+                    continue
+                disk_bytes = getattr(st, 'st_blocks', 0) * 512 or st.st_size
+                if st.st_nlink > 1:
+                    own.linked.append(((st.st_dev, st.st_ino), st.st_size, disk_bytes))
+                else:
+                    usage.bytes += st.st_size
+                    usage.disk_bytes += disk_bytes
+                    usage.files += 1
+        return own
+
+    def measure(self, path, on_progress=None, cancelled=None):
+        """Total Usage of the tree under `path`, or None if cancelled.
+        on_progress(partial Usage) is called from this thread while it runs."""
+        total = Usage()
+        seen = set()
+        visited = {}  # dir -> (own entries, bytes of first-seen hard links)
+        futures = {self.pool.submit(self._visit, path): path}
+        reported = time.monotonic()
+        while futures:
+            done, _ = wait(futures, timeout=self.progress_interval, return_when=FIRST_COMPLETED)
+            if cancelled is not None and cancelled.is_set():
+                for future in futures:
+                    future.cancel()
+                return None
+            for future in done:
+                directory = futures.pop(future)
+                try:
+                    own = future.result()
+                except OSError:
+                    total.errors += 1
+                    continue
+                linked = Usage()
+                for key, size, disk_bytes in own.linked:
+                    if key not in seen:
+                        seen.add(key)
+                        linked.add(Usage(size, disk_bytes, 1))
+                total.add(own.usage)
+                total.add(linked)
+                visited[directory] = (own, linked)
+                for name in own.subdirs:
+                    futures[self.pool.submit(self._visit, os.path.join(directory, name))] = os.path.join(directory, name)
+            if on_progress is not None and time.monotonic() - reported >= self.progress_interval:
+                reported = time.monotonic()
+                on_progress(total.copy())
+        self._aggregate(visited)
+        return total
+
+    def _aggregate(self, visited):
+        # Deepest directories first, so children are summed before parents
+        totals = {}
+        for directory in sorted(visited, key=lambda d: d.count(os.sep), reverse=True):
+            own, linked = visited[directory]
+            usage = own.usage.copy()
+            usage.add(linked)
+            for name in own.subdirs:
+                child = totals.get(os.path.join(directory, name))
+                if child is not None:
+                    usage.add(child)
+            totals[directory] = usage
+        with self.lock:
+            for directory, usage in totals.items():
+                self.recursive[directory] = usage
+                self.recursive.move_to_end(directory)
+            while len(self.recursive) > self.capacity:
+                self.recursive.popitem(last=False)
+
+    def total(self, path):
+        """Recursive Usage from the last walk that covered `path`, if any"""
+        with self.lock:
+            return self.recursive.get(path)
+
+    def invalidate(self, path):
+        """Forget the totals of `path` and every ancestor"""
+        with self.lock:
+            while True:
+                self.recursive.pop(path, None)
+                parent = os.path.dirname(path)
+                if parent == path:
+                    break
+                path = parent
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
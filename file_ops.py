@@ -0,0 +1,455 @@
+import errno
+import os
+import queue
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+MAX_FAILURES = 100
+_OPEN_DIR = (os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0) | getattr(os, 'O_NOFOLLOW', 0)
+             | getattr(os, 'O_CLOEXEC', 0))
+# O_BINARY: without it Windows translates newlines in os.read/os.write
+_OPEN_FILE = getattr(os, 'O_CLOEXEC', 0) | getattr(os, 'O_BINARY', 0)
+# Without descriptor-relative calls (Windows) BulkDelete works on paths instead
+_DIR_FD = ({os.open, os.stat, os.unlink, os.rmdir} <= os.supports_dir_fd
+           and os.scandir in os.supports_fd)
+# Errors meaning "this file pair can't be copied that way", not a real failure
+_NO_KERNEL_COPY = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+                   errno.ENOTSUP, errno.ENOTSOCK, errno.ETXTBSY}
+
+
+def outermost(paths):
+    """Absolute `paths` without duplicates or anything inside another of them"""
+    kept = []
+    for path in sorted({os.path.abspath(p) for p in paths}):
+        if not kept or not path.startswith(os.path.join(kept[-1], '')):
+            kept.append(path)
+    return kept
+
+
+class OpStats:
+    """Running totals of a bulk operation"""
+    __slots__ = ('files', 'dirs', 'bytes', 'errors', 'elapsed')
+
+    def __init__(self, files=0, dirs=0, size=0, errors=0, elapsed=0.0):
+        self.files = files
+        self.dirs = dirs
+        self.bytes = size
+        self.errors = errors
+        self.elapsed = elapsed
+
+    @property
+    def files_per_second(self):
+        return self.files / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+    def copy(self):
+        return OpStats(self.files, self.dirs, self.bytes, self.errors, self.elapsed)
+
+
+class _Dir:
+    """A directory being emptied. `pending` counts the listing itself plus
+    each subdirectory still in flight; the last one to finish removes it."""
+    __slots__ = ('parent', 'name', 'path', 'fd', 'pending', 'failed')
+
+    def __init__(self, parent, name, path, fd, pending=1):
+        self.parent = parent
+        self.name = name
+        self.path = path
+        self.fd = fd
+        self.pending = pending
+        self.failed = False
+
+
+class _BulkOp:
+    """Stats, failures and cancellation shared by the bulk operations"""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+        self.stats = OpStats()
+        self.failures = []  # (path, exception), the first MAX_FAILURES of them
+        self.started = None
+
+    def cancel(self):
+        """Stop taking new work; what is already done stays done"""
+        self.cancelled.set()
+
+    def snapshot(self):
+        with self.lock:
+            stats = self.stats.copy()
+        stats.elapsed = time.monotonic() - self.started
+        return stats
+
+    def _fail(self, path, error):
+        with self.lock:
+            self.stats.errors += 1
+            if len(self.failures) < MAX_FAILURES:
+                self.failures.append((path, error))
+
+
+class BulkDelete(_BulkOp):
+    """Removes files and whole trees on worker threads.
+
+    Directories are opened once and everything inside them is listed with
+    os.scandir on the descriptor and removed with dir_fd-relative unlink and
+    rmdir, so no path is resolved twice; where the OS has no dir_fd calls
+    they are listed and removed by path instead. Work is taken newest-first,
+    which walks depth-first and keeps the number of open descriptors near the
+    number of workers times the depth. Symlinks are removed, never followed.
+    """
+
+    def __init__(self, paths, workers=8):
+        super().__init__()
+        self.paths = outermost(paths)
+        self.workers = workers
+        self.done = threading.Event()
+        self.tasks = queue.LifoQueue()
+
+    def run(self, on_progress=None, progress_interval=0.1):
+        """Delete everything and return the final OpStats. on_progress(OpStats)
+        is called from this thread while it runs."""
+        self.started = time.monotonic()
+        by_parent = {}
+        for path in self.paths:
+            by_parent.setdefault(os.path.dirname(path), []).append(os.path.basename(path))
+        top = _Dir(None, None, None, None, pending=len(by_parent))
+        if not by_parent:
+            self.done.set()
+        for parent, names in by_parent.items():
+            try:
+                fd = os.open(parent, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0)) if _DIR_FD else None
+            except OSError as e:
+                for name in names:
+                    self._fail(os.path.join(parent, name), e)
+                self._release(top, failed=True)
+                continue
+            base = _Dir(top, None, parent, fd, pending=len(names))
+            for name in names:
+                self.tasks.put((base, name))
+
+        threads = [threading.Thread(target=self._work, name=f'delete-{i}', daemon=True)
+                   for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        while not self.done.wait(progress_interval):
+            if on_progress is not None:
+                on_progress(self.snapshot())
+        for _ in threads:
+            self.tasks.put(None)
+        for thread in threads:
+            thread.join()
+        return self.snapshot()
+
+    def _work(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+            self._remove(*task)
+
+    def _remove(self, parent, name):
+        """Remove entry `name` of `parent`, emptying it first if it is a directory"""
+        path = os.path.join(parent.path, name)
+        if self.cancelled.is_set():
+            self._release(parent, failed=True)
+            return
+        target = name if parent.fd is not None else path
+        try:
+            st = os.stat(target, dir_fd=parent.fd, follow_symlinks=False)
+            if not stat.S_ISDIR(st.st_mode):
+                os.unlink(target, dir_fd=parent.fd)
+                with self.lock:
+                    self.stats.files += 1
+                    self.stats.bytes += st.st_size
+                self._release(parent)
+                return
+            fd = os.open(name, _OPEN_DIR, dir_fd=parent.fd) if parent.fd is not None else None
+        except OSError as e:
+            self._fail(path, e)
+            self._release(parent, failed=True)
+            return
+
+        node = _Dir(parent, name, path, fd)
+        files = size = 0
+        try:
+            with os.scandir(path if fd is None else fd) as it:
+                for entry in it:
+                    if self.cancelled.is_set():
+                        node.failed = True
+                        break
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            with self.lock:
+                                node.pending += 1
+                            self.tasks.put((node, entry.name))
+                            continue
+                        entry_size = entry.stat(follow_symlinks=False).st_size
+                        os.unlink(entry.name if fd is not None else entry.path, dir_fd=fd)
+                    except OSError as e:
+                        self._fail(os.path.join(path, entry.name), e)
+                        node.failed = True
+                        continue
+                    files += 1
+                    size += entry_size
+                    if files % 256 == 0:
+                        with self.lock:
+                            self.stats.files += 256
+                            self.stats.bytes += size
+                        size = 0
+        except OSError as e:
+            self._fail(path, e)
+            node.failed = True
+        with self.lock:
+            self.stats.files += files % 256
+            self.stats.bytes += size
+        self._release(node)
+
+    def _release(self, node, failed=False):
+        """One thing `node` was waiting for is finished; finish it in turn if
+        it was the last, walking up as far as that goes"""
+        while node is not None:
+            with self.lock:
+                if failed:
+                    node.failed = True
+                node.pending -= 1
+                if node.pending:
+                    return
+            if node.fd is not None:
+                os.close(node.fd)
+            parent = node.parent
+            if node.name is None:
+                # A parent directory of selected paths, or the job itself
+                failed = node.failed
+                if parent is None:
+                    self.done.set()
+            elif node.failed or self.cancelled.is_set():
+                failed = True
+            else:
+                try:
+                    os.rmdir(node.name if parent.fd is not None else node.path, dir_fd=parent.fd)
+                    with self.lock:
+                        self.stats.dirs += 1
+                    failed = False
+                except OSError as e:
+                    self._fail(node.path, e)
+                    failed = True
+            node = parent
+
+
+def _copy_data(src, dst, size, chunk_size, on_chunk, cancelled):
+    """Copy the open `src` to `dst` in the kernel where it can, with
+    copy_file_range, then sendfile, then readinto through one buffer. Each
+    step carries on from the file positions the previous one left."""
+    copied = 0
+    for kernel_copy in (getattr(os, 'copy_file_range', None), getattr(os, 'sendfile', None)):
+        if kernel_copy is None:
+            continue
+        try:
+            while not cancelled.is_set():
+                if kernel_copy is os.sendfile:
+                    sent = os.sendfile(dst, src, None, chunk_size)
+                else:
+                    sent = os.copy_file_range(src, dst, chunk_size)
+                if not sent:
+                    break
+                copied += sent
+                on_chunk(sent)
+        except OSError as e:
+            if e.errno not in _NO_KERNEL_COPY:
+                raise
+            continue
+        # Some file systems (procfs, sysfs) report a size but copy nothing
+        if copied or not size:
+            return
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(src, 'rb', buffering=0, closefd=False) as reader:
+        while not cancelled.is_set():
+            count = reader.readinto(buffer)
+            if not count:
+                return
+            written = 0
+            while written < count:
+                written += os.write(dst, view[written:count])
+            on_chunk(count)
+
+
+class BulkCopy(_BulkOp):
+    """Copies (or moves) files and trees into a destination directory.
+
+    The sources are walked first so the total size is known for the ETA.
+    Directories and symlinks are then created on the calling thread and
+    regular files copied on a bounded pool, each through _copy_data.
+    Permissions and timestamps are kept, directories' last so copying into
+    them does not disturb their mtime. A move is one os.rename when source
+    and destination share a device, and otherwise a copy followed by
+    deleting the sources, which is skipped if anything failed.
+    """
+
+    def __init__(self, sources, destination, move=False, workers=8, chunk_size=1 << 20):
+        super().__init__()
+        self.sources = outermost(sources)
+        self.destination = os.path.abspath(destination)
+        self.move = move
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.total = OpStats()
+        self.targets = []  # destination path of each source handled
+
+    def remaining_seconds(self, stats):
+        """Estimated time left from the byte rate so far, or None"""
+        rate = stats.bytes_per_second
+        if not rate or self.total.bytes < stats.bytes:
+            return None
+        return (self.total.bytes - stats.bytes) / rate
+
+    def run(self, on_progress=None, progress_interval=0.1):
+        """Copy or move everything and return the final OpStats.
+        on_progress(OpStats) is called from this thread while it runs."""
+        self.started = time.monotonic()
+        dirs, links, files, copied_sources = [], [], [], []
+        try:
+            dest_dev = os.stat(self.destination).st_dev
+        except OSError as e:
+            self._fail(self.destination, e)
+            return self.snapshot()
+        for source in self.sources:
+            target = os.path.join(self.destination, os.path.basename(source))
+            try:
+                st = os.stat(source, follow_symlinks=False)
+                if os.path.lexists(target):
+                    raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), target)
+                if target.startswith(os.path.join(source, '')):
+                    raise OSError(errno.EINVAL, "cannot copy a folder into itself", source)
+                if self.move and st.st_dev == dest_dev:
+                    os.rename(source, target)
+                    with self.lock:
+                        if stat.S_ISDIR(st.st_mode):
+                            self.stats.dirs += 1
+                        else:
+                            self.stats.files += 1
+                            self.stats.bytes += st.st_size
+                    self.targets.append(target)
+                    continue
+                self._plan(source, target, st, dirs, links, files)
+            except OSError as e:
+                self._fail(source, e)
+                continue
+            self.targets.append(target)
+            copied_sources.append(source)
+
+        for path, target, st in dirs:
+            try:
+                os.mkdir(target, 0o700)
+                with self.lock:
+                    self.stats.dirs += 1
+            except OSError as e:
+                self._fail(target, e)
+        for path, target, st in links:
+            try:
+                os.symlink(os.readlink(path), target)
+                os.utime(target, ns=(st.st_atime_ns, st.st_mtime_ns), follow_symlinks=False)
+            except NotImplementedError:
+                pass
+            except OSError as e:
+                self._fail(path, e)
+
+        with ThreadPoolExecutor(self.workers, thread_name_prefix='copy') as pool:
+            futures = {pool.submit(self._copy_file, *job): job for job in files}
+            while futures:
+                done, _ = wait(futures, timeout=progress_interval)
+                for future in done:
+                    path, target, st = futures.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        # _copy_file handles OSError itself: anything else is a bug
+                        # that must still count, or a move would delete the source
+                        self._fail(path, error)
+                        self._discard(target)
+                if on_progress is not None:
+                    on_progress(self.snapshot())
+
+        # Deepest first: setting a directory's times must come after its contents
+        for path, target, st in reversed(dirs):
+            try:
+                os.chmod(target, stat.S_IMODE(st.st_mode))
+                os.utime(target, ns=(st.st_atime_ns, st.st_mtime_ns))
+            except OSError as e:
+                self._fail(target, e)
+
+        if self.move and copied_sources and not self.stats.errors and not self.cancelled.is_set():
+            removal = BulkDelete(copied_sources, self.workers)
+            removal.run()
+            for path, error in removal.failures:
+                self._fail(path, error)
+        return self.snapshot()
+
+    def _plan(self, source, target, st, dirs, links, files):
+        """Queue `source` and, for a directory, everything below it"""
+        stack = [(source, target, st)]
+        while stack:
+            path, target, st = stack.pop()
+            if stat.S_ISDIR(st.st_mode):
+                dirs.append((path, target, st))
+                try:
+                    with os.scandir(path) as it:
+                        for entry in it:
+                            try:
+                                child = entry.stat(follow_symlinks=False)
+                            except OSError as e:
+                                self._fail(entry.path, e)
+                                continue
+                            stack.append((entry.path, os.path.join(target, entry.name), child))
+                except OSError as e:
+                    # Unreadable folder: it is still created, and the failure keeps a move from deleting it
+                    self._fail(path, e)
+            elif stat.S_ISLNK(st.st_mode):
+                links.append((path, target, st))
+            elif stat.S_ISREG(st.st_mode):
+                files.append((path, target, st))
+                self.total.files += 1
+                self.total.bytes += st.st_size
+            else:
+                self._fail(path, OSError(errno.EPERM, "not a regular file, folder or link", path))
+
+    def _add_bytes(self, count):
+        with self.lock:
+            self.stats.bytes += count
+
+    def _copy_file(self, path, target, st):
+        if self.cancelled.is_set():
+            return
+        try:
+            src = os.open(path, os.O_RDONLY | _OPEN_FILE)
+            try:
+                dst = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_EXCL | _OPEN_FILE, 0o600)
+                try:
+                    _copy_data(src, dst, st.st_size, self.chunk_size, self._add_bytes, self.cancelled)
+                finally:
+                    os.close(dst)
+            finally:
+                os.close(src)
+            # By path, after closing: Windows has neither fchmod nor utime on a descriptor
+            os.utime(target, ns=(st.st_atime_ns, st.st_mtime_ns))
+            os.chmod(target, stat.S_IMODE(st.st_mode))
+        except OSError as e:
+            self._fail(path, e)
+            self._discard(target)
+            return
+        if self.cancelled.is_set():
+            self._discard(target)
+            return
+        with self.lock:
+            self.stats.files += 1
+
+    @staticmethod
+    def _discard(target):
+        try:
+            os.unlink(target)
+        except OSError:
+            pass
@@ -0,0 +1,242 @@
+import mmap
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+# Newlines are counted per block of this many bytes; finding a line scans
+# at most one block past its checkpoint
+INDEX_BLOCK = 1 << 14
+# Bytes read at a time while indexing
+INDEX_CHUNK = 1 << 22
+# A line longer than this is shown in pieces of this many bytes
+MAX_LINE_BYTES = 1 << 14
+HEX_WIDTH = 16
+SNIFF_BYTES = 8192
+_PRINTABLE = bytes(b if 32 <= b < 127 else ord('.') for b in range(256))
+
+
+class FilePreview:
+    """Read-only, memory-mapped view of a file for paging through it as text
+    or hex without reading the whole of it.
+
+    Pages are sliced out of the mapping on demand, so only what is shown
+    (plus what the OS reads ahead) is paged in. Touching a mapped page past
+    the end of a file that was truncated meanwhile kills the process with
+    SIGBUS, so every read first checks the file still covers the mapping and
+    sees nothing (b'') if not; changed() then tells the caller to reopen.
+    Text is addressed by byte offset from the start; line numbers need the
+    sparse line index that build_index() fills in, typically from a
+    background thread, with ordinary reads rather than through the mapping:
+    the number of newlines before every INDEX_BLOCK-byte block, so the offset
+    of any line, or the line at any offset, is found with one binary search
+    and a scan of a single block. Until the index reaches a part of the file,
+    its line numbers are unknown (None).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()  # close() waits for an index chunk in progress
+        self.file = open(path, 'rb')
+        try:
+            st = os.fstat(self.file.fileno())
+            self.size, self.mtime = st.st_size, st.st_mtime_ns
+            # Empty files can't be mapped; an empty bytes object slices the same way
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        except BaseException:
+            self.file.close()
+            raise
+        self.block_lines = array('Q')  # newlines before each indexed block
+        self.newlines = 0                # newlines in the indexed part
+        self.indexed = 0                 # bytes covered by block_lines
+        self.last_byte = None            # of the indexed part
+        self.line_count = None           # set once the index is complete
+        self.indexing = False            # a build_index() call is at work
+
+    def close(self):
+        with self.lock:
+            if isinstance(self.map, mmap.mmap):
+                self.map.close()
+            self.map = b''
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def changed(self):
+        """Whether the file was modified or replaced since it was mapped. A
+        mapping past the end of a truncated file can't be read, so reopen."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return True
+        return (st.st_size, st.st_mtime_ns) != (self.size, self.mtime)
+
+    def grow(self):
+        """Take in what was appended to the file since it was mapped: map it
+        afresh at its new size, keeping the line index, which build_index()
+        then extends. False if the file was instead replaced, rewritten or
+        truncated, and has to be reopened."""
+        try:
+            st = os.stat(self.path)
+            own = os.fstat(self.file.fileno())
+        except (OSError, ValueError):
+            return False
+        if (st.st_dev, st.st_ino) != (own.st_dev, own.st_ino) or own.st_size <= self.size:
+            return False
+        with self.lock:
+            old, self.map = self.map, mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.size, self.mtime = len(self.map), own.st_mtime_ns
+            self.line_count = None
+        if isinstance(old, mmap.mmap):
+            old.close()
+        return True
+
+    def claim_index(self):
+        """Whether the caller should run build_index(): False while an
+        earlier call is still going, as it picks up growth by itself"""
+        with self.lock:
+            if self.indexing:
+                return False
+            self.indexing = True
+            return True
+
+    def _data(self):
+        """The mapping, or b'' once the file no longer covers all of it"""
+        try:
+            if os.fstat(self.file.fileno()).st_size >= self.size:
+                return self.map
+        except (OSError, ValueError):  # ValueError: closed
+            pass
+        return b''
+
+    def is_binary(self):
+        """Guess from the first bytes whether hex suits the file better than text"""
+        return b'\0' in self._data()[:SNIFF_BYTES]
+
+    # === Line index ===
+    def build_index(self, on_progress=None, cancelled=None, progress_interval=0.2):
+        """Count newlines block by block up to the end of the file, calling
+        on_progress(bytes indexed) now and then. Returns False if cancelled.
+        Carries on from where an earlier call stopped, so after grow() only
+        the new part is read."""
+        last_report = time.monotonic()
+        chunk = bytearray(INDEX_CHUNK)
+        self.indexing = True
+        try:
+            while True:
+                if cancelled is not None and cancelled.is_set():
+                    return False
+                with self.lock:
+                    if self.file.closed:
+                        return False
+                    if self.indexed % INDEX_BLOCK and self.indexed < self.size:
+                        # The last block ended at the old end of a file that has grown
+                        self.newlines = self.block_lines.pop()
+                        self.indexed -= self.indexed % INDEX_BLOCK
+                    pos = self.indexed
+                    if pos >= self.size:
+                        # Done, under the lock so a grow() now sees it and starts another call
+                        self.line_count = self.newlines + (1 if self.size and self.last_byte != ord('\n') else 0)
+                        self.indexing = False
+                        break
+                    self.file.seek(pos)
+                    wanted = min(INDEX_CHUNK, self.size - pos)
+                    count = self.file.readinto(memoryview(chunk)[:wanted])
+                if count < wanted:
+                    return False  # truncated: changed() says so and the file is reopened
+                for block in range(0, count, INDEX_BLOCK):
+                    self.block_lines.append(self.newlines)
+                    self.newlines += chunk.count(b'\n', block, min(block + INDEX_BLOCK, count))
+                self.last_byte = chunk[count - 1]
+                self.indexed = pos + count
+                if on_progress is not None and time.monotonic() - last_report >= progress_interval:
+                    last_report = time.monotonic()
+                    on_progress(self.indexed)
+        finally:
+            self.indexing = False
+        if on_progress is not None:
+            on_progress(self.size)
+        return True
+
+    def offset_of_line(self, line):
+        """Byte offset where line number `line` (from 0) starts, or None if
+        the index doesn't reach it yet or the file is shorter"""
+        if line <= 0:
+            return 0
+        block = bisect_left(self.block_lines, line) - 1  # last block starting before the line's newline
+        if block < 0 or (block == len(self.block_lines) - 1 and self.line_count is None):
+            return None
+        start = block * INDEX_BLOCK
+        end = min(start + INDEX_BLOCK, self.size)
+        data, pos = self._data(), start - 1
+        for _ in range(line - self.block_lines[block]):
+            pos = data.find(b'\n', pos + 1, end)
+            if pos == -1:
+                return None
+        return pos + 1
+
+    def line_at(self, offset):
+        """Line number (from 0) holding byte `offset`, or None if not indexed yet"""
+        block = offset // INDEX_BLOCK
+        if block >= len(self.block_lines) or (block == len(self.block_lines) - 1 and self.line_count is None):
+            return None
+        start = block * INDEX_BLOCK
+        return self.block_lines[block] + self._data()[start:offset].count(b'\n')
+
+    # === Text pages ===
+    def line_start(self, offset):
+        """Start of the line holding `offset`, or `offset` itself when that
+        line began more than MAX_LINE_BYTES earlier"""
+        offset = max(0, min(offset, self.size))
+        start = self._find_line_start(offset)
+        return offset if start is None else start
+
+    def _find_line_start(self, offset):
+        lo = max(0, offset - MAX_LINE_BYTES)
+        newline = self._data().rfind(b'\n', lo, offset)
+        if newline != -1:
+            return newline + 1
+        return 0 if lo == 0 else None
+
+    def lines_from(self, offset, count):
+        """[(offset, bytes)] of up to `count` lines starting at `offset`, each
+        without its newline and cut at MAX_LINE_BYTES"""
+        data, lines = self._data(), []
+        while len(lines) < count and offset < self.size:
+            end = min(offset + MAX_LINE_BYTES, self.size)
+            newline = data.find(b'\n', offset, end)
+            stop = newline if newline != -1 else end
+            lines.append((offset, data[offset:stop]))
+            offset = stop + 1 if newline != -1 else stop
+        return lines
+
+    def next_line(self, offset):
+        """Offset of the line after the one starting at `offset`"""
+        lines = self.lines_from(offset, 2)
+        return lines[1][0] if len(lines) == 2 else offset
+
+    def lines_before(self, offset, count):
+        """Offset `count` lines above the line starting at `offset`"""
+        for _ in range(count):
+            if offset <= 0:
+                return 0
+            start = self._find_line_start(offset - 1)
+            offset = start if start is not None else offset - MAX_LINE_BYTES
+        return offset
+
+    # === Hex pages ===
+    def hex_rows(self, offset, rows, width=HEX_WIDTH):
+        """Hex dump lines for `rows` rows of `width` bytes from `offset`"""
+        offset -= offset % width
+        data = self._data()[offset:offset + rows * width]
+        dump = []
+        for row in range(0, len(data), width):
+            chunk = data[row:row + width]
+            hex_part = chunk.hex(' ').ljust(width * 3 - 1)
+            dump.append(f"{offset + row:010x}  {hex_part}  {chunk.translate(_PRINTABLE).decode('ascii')}")
+        return dump
@@ -0,0 +1,165 @@
+"""Run explorer operations in batch, without the GUI.
+
+    python fs_cli.py ops.txt
+    printf 'mkdir /tmp/a\ntouch /tmp/a/b\nls /tmp/a\n' | python fs_cli.py
+
+Operations are read one per line from the file (or stdin when it is `-` or
+missing) and split like a shell command line, so names with spaces can be
+quoted. Blank lines and lines starting with `#` are ignored:
+
+    ls PATH                 stat PATH             perms PATH
+    chmod PATH LEVEL        touch PATH            mkdir PATH
+    rm PATH                 mv PATH NEW_NAME      du PATH
+    cp SOURCE... DEST_DIR   move SOURCE... DEST_DIR
+    alloc SIZE              free START SIZE       map
+    strategy NAME
+
+LEVEL is a "Modify Permissions" choice (1-6) or an octal mode. The alloc,
+free, map and strategy operations act on one StorageAllocator that lives
+for the whole batch, in memory or, with --volume, in a file that keeps it
+between runs. Each operation prints one JSON line; the exit status is 1 if
+any of them failed.
+"""
+import argparse
+import json
+import os
+import shlex
+import sys
+
+import fs_core
+from allocator import STRATEGIES, FirstFit, StorageAllocator
+from persistent_allocator import PersistentStorageAllocator
+
+
+def _stat(path):
+    info = fs_core.details(path)
+    info['modified'] = fs_core.format_time(info['modified'])
+    info['created'] = fs_core.format_time(info['created'])
+    return info
+
+
+def _perms(path):
+    return fs_core.permissions(os.stat(path).st_mode)
+
+
+def _du(path):
+    from disk_usage import DiskUsage
+    disk_usage = DiskUsage()
+    try:
+        usage = disk_usage.measure(path)
+    finally:
+        disk_usage.shutdown()
+    return {'bytes': usage.bytes, 'disk_bytes': usage.disk_bytes, 'files': usage.files,
+            'dirs': usage.dirs, 'errors': usage.errors}
+
+
+def _copy(move, *paths):
+    if len(paths) < 2:
+        raise ValueError("expected SOURCE... DEST_DIR")
+    job = fs_core.copy(paths[:-1], paths[-1], move=move)
+    if job.failures:
+        path, error = job.failures[0]
+        raise OSError(error.errno, f"{error.strerror or error} ({job.stats.errors} failed)", path)
+    return {'targets': job.targets, 'files': job.stats.files, 'bytes': job.stats.bytes}
+
+
+def _alloc(storage, size):
+    start = storage.allocate(int(size))
+    if start == -1:
+        raise ValueError("not enough contiguous free blocks")
+    return {'start': start, 'end': start + storage.reserved_size(int(size)) - 1}
+
+
+def _strategy(storage, name):
+    storage.set_strategy(name)
+    return name
+
+
+# op -> (handler, number of arguments or None for "one or more", needs the allocator)
+OPERATIONS = {
+    'ls': (lambda path: [{'name': name, 'dir': is_dir} for name, is_dir, _ in fs_core.list_dir(path)], 1, False),
+    'stat': (_stat, 1, False),
+    'perms': (_perms, 1, False),
+    'chmod': (fs_core.set_permissions, 2, False),
+    'touch': (fs_core.create_file, 1, False),
+    'mkdir': (fs_core.create_dir, 1, False),
+    'rm': (fs_core.delete, 1, False),
+    'mv': (fs_core.rename, 2, False),
+    'du': (_du, 1, False),
+    'cp': (lambda *paths: _copy(False, *paths), None, False),
+    'move': (lambda *paths: _copy(True, *paths), None, False),
+    'alloc': (_alloc, 1, True),
+    'free': (lambda storage, start, size: storage.deallocate(int(start), int(size)), 2, True),
+    'map': (lambda storage: storage.get_allocation_map(), 0, True),
+    'strategy': (_strategy, 1, True),
+}
+
+
+def run_line(line, storage):
+    """Result dict for one operation line, or None if it holds none"""
+    try:
+        args = shlex.split(line, comments=True)
+    except ValueError as e:
+        return {'op': None, 'ok': False, 'error': f"ValueError: {e}"}
+    if not args:
+        return None
+    op, args = args[0], args[1:]
+    result = {'op': op}
+    try:
+        if op not in OPERATIONS:
+            raise ValueError(f"unknown operation {op!r}")
+        handler, count, uses_storage = OPERATIONS[op]
+        if (len(args) != count) if count is not None else not args:
+            raise ValueError(f"{op} takes {count if count is not None else 'one or more'} argument(s)")
+        value = handler(storage, *args) if uses_storage else handler(*args)
+        result['ok'] = True
+        if value is not None:
+            result['result'] = value
+    except (OSError, ValueError, KeyError) as e:
+        result['ok'] = False
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run file and storage operations in batch.")
+    parser.add_argument('file', nargs='?', default='-', help="operations file (default stdin)")
+    parser.add_argument('--blocks', type=int, default=100, help="size of the storage volume")
+    parser.add_argument('--strategy', choices=list(STRATEGIES),
+                        help="initial placement strategy (default: the volume's, or First Fit)")
+    parser.add_argument('--volume', metavar='PATH',
+                        help="keep the storage volume in this file, created with --blocks blocks if missing")
+    parser.add_argument('--stop-on-error', action='store_true', help="stop at the first failed operation")
+    parser.add_argument('--errors-only', action='store_true', help="print only failed operations")
+    args = parser.parse_args(argv)
+
+    if args.volume:
+        try:
+            storage = PersistentStorageAllocator(
+                args.volume, None if os.path.exists(args.volume) else args.blocks, args.strategy)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    else:
+        storage = StorageAllocator(args.blocks, args.strategy or FirstFit.name)
+    source = sys.stdin if args.file == '-' else open(args.file)
+    failed = False
+    try:
+        for number, line in enumerate(source, 1):
+            result = run_line(line, storage)
+            if result is None:
+                continue
+            failed = failed or not result['ok']
+            if not result['ok'] or not args.errors_only:
+                sys.stdout.write(json.dumps({'line': number, **result}) + '\n')
+            if failed and args.stop_on_error:
+                break
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if args.volume:
+            storage.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""File operations behind the explorer, without any GUI imports, for
+scripts, the batch CLI (fs_cli.py) and headless servers. The storage
+allocator (allocator.py) is GUI-free as well."""
+import os
+import stat
+import time
+
+from metadata_cache import scan_listing
+
+# Choices offered by "Modify Permissions": (label, mode)
+PERMISSION_LEVELS = {
+    '1': ("Read Only", stat.S_IRUSR),
+    '2': ("Write Only", stat.S_IWUSR),
+    '3': ("Execute Only", stat.S_IXUSR),
+    '4': ("Read + Write", stat.S_IRUSR | stat.S_IWUSR),
+    '5': ("Read + Execute", stat.S_IRUSR | stat.S_IXUSR),
+    '6': ("Full Control", stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR),
+}
+
+_PERMISSION_BITS = {
+    'Owner': (stat.S_IRUSR, stat.S_IWUSR, stat.S_IXUSR),
+    'Group': (stat.S_IRGRP, stat.S_IWGRP, stat.S_IXGRP),
+    'Others': (stat.S_IROTH, stat.S_IWOTH, stat.S_IXOTH),
+}
+
+
+def format_time(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+
+def cache_dir(*parts):
+    """The explorer's folder under $XDG_CACHE_HOME (or ~/.cache), joined with `parts`"""
+    cache = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache, 'file-system-explorer', *parts)
+
+
+def list_dir(path):
+    """[(name, is_dir, is_file)] of `path`, sorted case-insensitively"""
+    return sorted(scan_listing(path), key=lambda entry: (entry[0].lower(), entry[0]))
+
+
+def details(path, st=None, listing=None):
+    """What "Show Details" reports: a dict with 'path', 'type' ('file',
+    'directory' or 'other'), 'modified', 'created' and, per type, 'size' or
+    'files' and 'dirs'. `st` and `listing` may come from a cache."""
+    if st is None:
+        st = os.stat(path)
+    info = {'path': path, 'modified': st.st_mtime, 'created': st.st_ctime}
+    if stat.S_ISREG(st.st_mode):
+        info.update(type='file', size=st.st_size)
+    elif stat.S_ISDIR(st.st_mode):
+        if listing is None:
+            listing = scan_listing(path)
+        info.update(type='directory',
+                    files=sum(1 for _, _, is_file in listing if is_file),
+                    dirs=sum(1 for _, is_dir, _ in listing if is_dir))
+    else:
+        info['type'] = 'other'
+    return info
+
+
+def permissions(mode):
+    """{'Owner'|'Group'|'Others': {'Read'|'Write'|'Execute': bool}} of a st_mode"""
+    return {who: {'Read': bool(mode & r), 'Write': bool(mode & w), 'Execute': bool(mode & x)}
+            for who, (r, w, x) in _PERMISSION_BITS.items()}
+
+
+def set_permissions(path, level):
+    """chmod `path` to a PERMISSION_LEVELS key or an octal mode like '644';
+    returns a label for what was set"""
+    if level in PERMISSION_LEVELS:
+        label, mode = PERMISSION_LEVELS[level]
+    else:
+        try:
+            mode = int(level, 8)
+        except ValueError:
+            raise ValueError(f"unknown permission level {level!r}") from None
+        label = f"{mode:o}"
+    os.chmod(path, mode)
+    return label
+
+
+def create_file(path):
+    """Create an empty file, failing if `path` exists"""
+    with open(path, 'x'):
+        pass
+
+
+def create_dir(path):
+    os.mkdir(path)
+
+
+def delete(path, workers=8):
+    """Remove a file, symlink or whole tree, raising the first error"""
+    if not stat.S_ISDIR(os.lstat(path).st_mode):
+        os.remove(path)
+        return
+    # Imported here so scripts that never delete a tree skip the thread pool
+    from file_ops import BulkDelete
+    job = BulkDelete([path], workers)
+    job.run()
+    if job.failures:
+        raise job.failures[0][1]
+
+
+def rename(path, new_name):
+    """Rename `path` within its directory (or to `new_name` if it is a path);
+    returns the new path"""
+    new_path = os.path.join(os.path.dirname(path), new_name)
+    os.rename(path, new_path)
+    return new_path
+
+
+def copy(sources, destination, move=False, workers=8):
+    """Copy or move `sources` into the directory `destination`; returns the
+    file_ops.BulkCopy job after it ran, with its stats and failures"""
+    from file_ops import BulkCopy
+    job = BulkCopy(sources, destination, move=move, workers=workers)
+    job.run()
+    return job
+
@@ -0,0 +1,277 @@
+import ctypes
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+# inotify(7) constants
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT = struct.Struct('iIII')
+
+
+class DirectoryChanges:
+    """Net effect of the events seen in one directory since the last drain"""
+    __slots__ = ('added', 'removed', 'renamed', 'rescan')
+
+    def __init__(self):
+        self.added = {}    # name -> is_dir
+        self.removed = set()
+        self.renamed = {}  # old name -> new name
+        self.rescan = False
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.renamed or self.rescan)
+
+    def add(self, name, is_dir):
+        self.added[name] = is_dir
+
+    def remove(self, name):
+        if name in self.added:
+            # Created and removed again: only an entry it replaced is affected
+            del self.added[name]
+            return
+        for old, new in self.renamed.items():
+            if new == name:
+                del self.renamed[old]
+                self.removed.add(old)
+                return
+        self.removed.add(name)
+
+    def rename(self, old, new, is_dir):
+        self.added.pop(new, None)
+        if old in self.added:
+            del self.added[old]
+            self.added[new] = is_dir
+            return
+        for original, current in self.renamed.items():
+            if current == old:
+                if original == new:
+                    del self.renamed[original]
+                else:
+                    self.renamed[original] = new
+                return
+        self.renamed[old] = new
+
+    def merge(self, later):
+        """Fold in changes that happened after these"""
+        for name in later.removed:
+            self.remove(name)
+        for old, new in later.renamed.items():
+            self.rename(old, new, None)
+        for name, is_dir in later.added.items():
+            self.add(name, is_dir)
+        self.rescan = self.rescan or later.rescan
+
+
+def _inotify():
+    if not sys.platform.startswith('linux'):
+        return None, None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        init = libc.inotify_init1
+    except (OSError, AttributeError, TypeError):
+        return None, None
+    fd = init(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+        return None, None
+    return libc, fd
+
+
+def _snapshot(path):
+    """(directory mtime, {name: (inode, is_dir)}) for the polling fallback"""
+    mtime = os.stat(path).st_mtime_ns
+    entries = {}
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                entries[entry.name] = (entry.inode(), entry.is_dir())
+            except OSError:
+                pass
+    return mtime, entries
+
+
+class DirectoryWatcher:
+    """Reports create/delete/move events for a set of directories.
+
+    Uses Linux inotify when available and falls back to polling each
+    directory's mtime (re-listing only directories that changed) otherwise,
+    or for directories inotify refuses, e.g. past max_user_watches. Events
+    are coalesced per directory until the UI calls drain().
+    """
+
+    def __init__(self, poll_interval=1.0, use_inotify=True):
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.pending = {}  # dir -> DirectoryChanges
+        self.polled = {}   # dir -> snapshot
+        self.wds = {}      # watch descriptor -> dir
+        self.watches = {}  # dir -> watch descriptor
+        self.libc, self.fd = _inotify() if use_inotify else (None, None)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='fs-watch', daemon=True)
+        self.thread.start()
+
+    def watch(self, path):
+        with self.lock:
+            if path in self.watches or path in self.polled:
+                return
+            if self.fd is not None:
+                wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+                if wd >= 0:
+                    self.watches[path] = wd
+                    self.wds[wd] = path
+                    return
+                if ctypes.get_errno() not in (errno.ENOSPC, errno.ENOMEM):
+                    return
+        try:
+            snapshot = _snapshot(path)
+        except OSError:
+            return
+        with self.lock:
+            self.polled[path] = snapshot
+
+    def unwatch(self, path):
+        with self.lock:
+            self.polled.pop(path, None)
+            self.pending.pop(path, None)
+            wd = self.watches.pop(path, None)
+            if wd is not None:
+                self.wds.pop(wd, None)
+                self.libc.inotify_rm_watch(self.fd, wd)
+
+    def drain(self):
+        """Take the coalesced {dir: DirectoryChanges} seen since the last call"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        return pending
+
+    def requeue(self, path, changes):
+        """Put back changes the caller could not apply yet"""
+        with self.lock:
+            later = self.pending.get(path)
+            if later is not None:
+                changes.merge(later)
+            self.pending[path] = changes
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def _changes(self, path):
+        changes = self.pending.get(path)
+        if changes is None:
+            changes = self.pending[path] = DirectoryChanges()
+        return changes
+
+    def _run(self):
+        next_poll = time.monotonic() + self.poll_interval
+        while not self.stopped.is_set():
+            timeout = max(0.0, next_poll - time.monotonic())
+            if self.fd is not None:
+                ready, _, _ = select.select([self.fd], [], [], min(timeout, 0.5))
+                if ready:
+                    self._read_events()
+            else:
+                self.stopped.wait(timeout)
+            if time.monotonic() >= next_poll:
+                self._poll()
+                next_poll = time.monotonic() + self.poll_interval
+
+    def _read_events(self):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        moves = {}  # cookie -> (dir, name, is_dir) waiting for its IN_MOVED_TO
+        with self.lock:
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    for path in self.watches:
+                        self._changes(path).rescan = True
+                    continue
+                path = self.wds.get(wd)
+                if path is None:
+                    continue
+                is_dir = bool(mask & IN_ISDIR)
+                if mask & IN_CREATE:
+                    self._changes(path).add(name, is_dir)
+                elif mask & IN_DELETE:
+                    self._changes(path).remove(name)
+                elif mask & IN_MOVED_FROM:
+                    moves[cookie] = (path, name, is_dir)
+                elif mask & IN_MOVED_TO:
+                    source = moves.pop(cookie, None)
+                    if source is not None and source[0] == path:
+                        self._changes(path).rename(source[1], name, is_dir)
+                    else:
+                        if source is not None:
+                            self._changes(source[0]).remove(source[1])
+                        self._changes(path).add(name, is_dir)
+                elif mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                    self._changes(path).rescan = True
+                    if mask & IN_IGNORED:
+                        del self.wds[wd]
+                        self.watches.pop(path, None)
+            # Moved out of every watched directory
+            for path, name, _ in moves.values():
+                self._changes(path).remove(name)
+
+    def _poll(self):
+        with self.lock:
+            polled = list(self.polled.items())
+        for path, (mtime, entries) in polled:
+            try:
+                if os.stat(path).st_mtime_ns == mtime:
+                    continue
+                snapshot = _snapshot(path)
+            except OSError:
+                with self.lock:
+                    if path in self.polled:
+                        self._changes(path).rescan = True
+                continue
+            current = snapshot[1]
+            with self.lock:
+                if path not in self.polled:
+                    continue
+                self.polled[path] = snapshot
+                changes = self._changes(path)
+                gone = {entries[name][0]: name for name in entries.keys() - current.keys()}
+                for name in current.keys() - entries.keys():
+                    inode, is_dir = current[name]
+                    if inode in gone:
+                        changes.rename(gone.pop(inode), name, is_dir)
+                    else:
+                        changes.add(name, is_dir)
+                for name in gone.values():
+                    changes.remove(name)
+                for name in current.keys() & entries.keys():
+                    if current[name][0] != entries[name][0]:
+                        changes.remove(name)
+                        changes.add(name, current[name][1])
+                if not changes:
+                    del self.pending[path]
@@ -0,0 +1,98 @@
+import functools
+import hashlib
+import os
+import sys
+import tkinter as tk
+
+import fs_core
+
+ICON_SIZE = 24
+EMOJI_FONT = "seguiemj.ttf"
+# Bump when the drawing below changes, so old PNGs are not reused
+RENDER_VERSION = 1
+
+misses = 0
+
+
+def cache_dir():
+    return fs_core.cache_dir('icons')
+
+
+@functools.lru_cache(maxsize=None)
+def font_file(name):
+    """Path of the font file ImageFont.truetype(name) would load, found the
+    way Pillow searches, or None when Pillow would fall back to its default
+    font. Worked out without importing Pillow, so cache hits stay cheap."""
+    if os.path.isfile(name):
+        return os.path.abspath(name)
+    if sys.platform == 'win32':
+        dirs = [os.path.join(os.environ['WINDIR'], 'fonts')] if os.environ.get('WINDIR') else []
+    elif sys.platform.startswith('linux'):
+        data_home = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+        data_dirs = os.environ.get('XDG_DATA_DIRS') or '/usr/local/share:/usr/share'
+        dirs = [os.path.join(d, 'fonts') for d in [data_home] + data_dirs.split(':')]
+    elif sys.platform == 'darwin':
+        dirs = ['/Library/Fonts', '/System/Library/Fonts', os.path.expanduser('~/Library/Fonts')]
+    else:
+        dirs = []
+    for directory in dirs:
+        for root, _, files in os.walk(directory):
+            if name in files:
+                return os.path.join(root, name)
+    return None
+
+
+def icon_path(color, emoji=None, font=EMOJI_FONT):
+    # Keyed on the font file actually drawn with, so icons rendered with the
+    # fallback font are redrawn once the real one is installed
+    key = f"{RENDER_VERSION}|{ICON_SIZE}|{color}|{emoji or ''}|{font_file(font) or ''}"
+    return os.path.join(cache_dir(), hashlib.sha1(key.encode()).hexdigest()[:20] + '.png')
+
+
+@functools.lru_cache(maxsize=None)
+def _font(name):
+    from PIL import ImageFont
+    path = font_file(name)
+    try:
+        if path is not None:
+            return ImageFont.truetype(path, 16)
+    except OSError:
+        pass
+    return ImageFont.load_default()
+
+
+def draw_icon(color, emoji=None, font=EMOJI_FONT):
+    """PIL image of an icon: a circle with the emoji on top. Pillow is only
+    imported here, when the cache misses."""
+    from PIL import Image, ImageDraw
+    icon = Image.new('RGBA', (ICON_SIZE, ICON_SIZE), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(icon)
+    draw.ellipse([2, 2, ICON_SIZE - 2, ICON_SIZE - 2], fill=color)
+    if emoji:
+        bbox = draw.textbbox((0, 0), emoji, font=_font(font))
+        w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
+        draw.text(((ICON_SIZE - w) / 2, (ICON_SIZE - h) / 2 - 2), emoji, font=_font(font), embedded_color=True)
+    return icon
+
+
+def load_icon(color, emoji=None, master=None):
+    """tk.PhotoImage of an icon, read from the PNG cache and rendered into it
+    the first time a colour/emoji/font combination is asked for"""
+    global misses
+    path = icon_path(color, emoji)
+    try:
+        return tk.PhotoImage(file=path, master=master)
+    except tk.TclError:
+        pass
+    misses += 1
+    icon = draw_icon(color, emoji)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f"{path}.{os.getpid()}.tmp"
+        icon.save(partial, 'PNG')
+        os.replace(partial, path)
+        return tk.PhotoImage(file=path, master=master)
+    except (OSError, tk.TclError):
+        # Cache not writable: hand the image to Tk directly
+        from PIL import ImageTk
+        return ImageTk.PhotoImage(icon, master=master)
@@ -1,46 +1,287 @@
+import time
+STARTED = time.perf_counter()  # before the imports, for --measure-startup
+
+import argparse
+import json
 import os
-import shutil
+import queue
+import sqlite3
 import stat
-from datetime import datetime
+import threading
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
-from PIL import Image, ImageTk, ImageDraw, ImageFont
-
-class StorageAllocator:
-    def __init__(self, size=100):
-        self.size = size
-        self.blocks = [0] * size
-
-    def first_fit_allocate(self, size):
-        start = -1
-        free_blocks = 0
-        for i in range(len(self.blocks)):
-            if self.blocks[i] == 0:
-                if free_blocks == 0:
-                    start = i
-                free_blocks += 1
-                if free_blocks == size:
-                    for j in range(start, start + size):
-                        self.blocks[j] = 1
-                    return start
+from tkinter import ttk, filedialog, messagebox, simpledialog
+from allocation_map import AllocationMap
+from allocator import STRATEGIES, StorageAllocator
+from disk_usage import DiskUsage, format_size
+from file_ops import BulkCopy, BulkDelete
+import fs_core
+from fs_watch import DirectoryChanges, DirectoryWatcher
+import icon_cache
+from metadata_cache import MetadataCache, iter_listing
+from path_index import SEARCH_MODES, PathIndex
+from persistent_allocator import PersistentStorageAllocator, default_volume_path
+from preview_pane import PreviewPane
+IMPORTED = time.perf_counter()
+
+LOADING_TEXT = "loading…"
+# Directories with more entries than this are shown through a sliding window
+VIRTUAL_THRESHOLD = 5000
+VIRTUAL_WINDOW = 300
+VIRTUAL_MARGIN = 100
+WATCH_POLL_MS = 250
+SEARCH_DELAY_MS = 150
+SEARCH_LIMIT = 500
+INDEX_DELAY_MS = 500
+PREVIEW_DELAY_MS = 100
+STORAGE_LOG_LINES = 500
+DEFAULT_VOLUME_BLOCKS = 100
+# A persistent volume is checkpointed once changes to it pause this long,
+# unless its free space is in so many pieces the Tk thread would stall
+CHECKPOINT_DELAY_MS = 2000
+CHECKPOINT_MAX_EXTENTS = 100_000
+PARTIAL_TEXT = "⋯ reopen to list everything"
+
+class DirectoryModel:
+    """Sorted listing of one directory kept outside Tk: names packed into a
+    single UTF-8 buffer with an offsets array, directory flags in a bytearray"""
+
+    def __init__(self, path, entries):
+        # entries: (sort_key, name, path, is_dir) tuples in any order
+        entries.sort()
+        self.path = path
+        self.data = bytearray()
+        self.offsets = array('Q', [0])
+        self.dirs = bytearray(len(entries))
+        for i, (_, name, _, is_dir) in enumerate(entries):
+            self.data += name.encode('utf-8', 'surrogateescape')
+            self.offsets.append(len(self.data))
+            self.dirs[i] = is_dir
+
+    def __len__(self):
+        return len(self.dirs)
+
+    def name(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].decode('utf-8', 'surrogateescape')
+
+    def path_of(self, i):
+        return os.path.join(self.path, self.name(i))
+
+    def is_dir(self, i):
+        return bool(self.dirs[i])
+
+    def position(self, key):
+        """Index of the first name whose (lower, name) key is not below `key`"""
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            other = self.name(mid)
+            if (other.lower(), other) < key:
+                lo = mid + 1
             else:
-                free_blocks = 0
-                start = -1
-        return -1
+                hi = mid
+        return lo
+
+    def find(self, name):
+        """Index of `name` by binary search over the sorted names, or -1"""
+        lo = self.position((name.lower(), name))
+        return lo if lo < len(self) and self.name(lo) == name else -1
+
+    def with_changes(self, removed, added):
+        """New model without the `removed` names and with `added` {name: is_dir}.
+        Only the changed names are looked up and encoded; the runs between
+        them are copied across in bulk."""
+        # (old index, 0, new entry) inserts before old index; (old index, 1, None) drops it
+        edits = [(i, 1, None) for i in {self.find(name) for name in {*removed, *added}} if i != -1]
+        edits += [(self.position((name.lower(), name)), 0, (name.lower(), name, is_dir))
+                  for name, is_dir in added.items()]
+        edits.sort()
+        model = DirectoryModel(self.path, [])
+        copied = 0  # names of this model before here are in `model`
+
+        def copy_to(end):
+            nonlocal copied
+            if end > copied:
+                start, stop = self.offsets[copied], self.offsets[end]
+                shift = len(model.data) - start
+                model.data += memoryview(self.data)[start:stop]
+                tail = self.offsets[copied + 1:end + 1]
+                model.offsets.extend(tail if not shift else array('Q', [offset + shift for offset in tail]))
+                model.dirs += self.dirs[copied:end]
+            copied = max(copied, end)
+
+        for index, drop, entry in edits:
+            copy_to(index)
+            if drop:
+                copied = index + 1
+            else:
+                model.data += entry[1].encode('utf-8', 'surrogateescape')
+                model.offsets.append(len(model.data))
+                model.dirs.append(entry[2])
+        copy_to(len(self))
+        return model
+
+class _ListedChildren:
+    """Sorted (key, name) list and name -> item map of a fully listed node,
+    so watcher events can be applied without asking Tk for every child"""
+    def __init__(self, keys, items):
+        self.keys = keys
+        self.items = items
+
+class _VirtualChildren:
+    def __init__(self, model):
+        self.model = model
+        self.lo = 0
+        self.hi = 0
+        self.items = {}    # model index -> tree item
+        self.indexes = {}  # tree item -> model index
+        self.above = None
+        self.below = None
+
+class _LoadJob:
+    def __init__(self, key, path, on_batch, on_done):
+        self.key = key
+        self.path = path
+        self.on_batch = on_batch
+        self.on_done = on_done
+        self.cancelled = threading.Event()
+
+class DirectoryLoader:
+    """Lists directories on worker threads and feeds the entries back to the
+    Tk loop in small batches, so a slow or huge directory never blocks the UI"""
+    FIRST_BATCH = 100
+    BATCH = 2000
+
+    def __init__(self, root, cache, workers=4, poll_ms=10, budget_ms=20):
+        self.root = root
+        self.cache = cache
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dir-loader')
+        self.results = queue.SimpleQueue()
+        self.jobs = {}
+        self.poll_ms = poll_ms
+        self.budget = budget_ms / 1000
+        self.polling = False
+
+    def load(self, key, path, on_batch, on_done):
+        """Stream `path` into on_batch(entries) then on_done(error), replacing
+        any load still running for `key`"""
+        self.cancel(key)
+        job = _LoadJob(key, path, on_batch, on_done)
+        self.jobs[key] = job
+        self.pool.submit(self._scan, job)
+        self._schedule()
+
+    def cancel(self, key):
+        job = self.jobs.pop(key, None)
+        if job is None:
+            return False
+        job.cancelled.set()
+        return True
+
+    def pending(self):
+        return list(self.jobs)
+
+    def shutdown(self):
+        for key in self.pending():
+            self.cancel(key)
+        self.pool.shutdown(wait=False, cancel_futures=True)
 
-    def deallocate(self, start, size):
-        for i in range(start, start + size):
-            if i < len(self.blocks):
-                self.blocks[i] = 0
+    def _scan(self, job):
+        # Worker thread: never touch Tk here
+        batch, limit = [], self.FIRST_BATCH
+        cached = self.cache.listing(job.path)
+        scanned = []
+        try:
+            for entry in cached if cached is not None else iter_listing(job.path):
+                if job.cancelled.is_set():
+                    return
+                name, is_dir = entry[0], entry[1]
+                batch.append((name.lower(), name, os.path.join(job.path, name), is_dir))
+                if cached is None:
+                    scanned.append(entry)
+                if len(batch) >= limit:
+                    self.results.put((job, batch, False, None))
+                    batch, limit = [], self.BATCH
+        except OSError as e:
+            self.results.put((job, batch, True, e))
+            return
+        if cached is None:
+            self.cache.store_listing(job.path, scanned)
+        self.results.put((job, batch, True, None))
+
+    def _schedule(self):
+        if not self.polling:
+            self.polling = True
+            self.root.after(self.poll_ms, self._poll)
 
-    def get_allocation_map(self):
-        return "".join(['X' if x else '.' for x in self.blocks])
+    def _poll(self):
+        self.polling = False
+        deadline = time.perf_counter() + self.budget
+        while time.perf_counter() < deadline:
+            try:
+                job, batch, done, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if self.jobs.get(job.key) is not job:
+                continue  # cancelled or superseded
+            if batch:
+                job.on_batch(batch)
+            if done and self.jobs.get(job.key) is job:
+                del self.jobs[job.key]
+                job.on_done(error)
+        if self.jobs or not self.results.empty():
+            self._schedule()
+
+class UiQueue:
+    """Runs callbacks posted from worker threads on the Tk thread"""
+
+    def __init__(self, root, poll_ms=30, budget_ms=20):
+        self.root = root
+        self.calls = queue.SimpleQueue()
+        self.poll_ms = poll_ms
+        self.budget = budget_ms / 1000
+        self.root.after(self.poll_ms, self._drain)
+
+    def post(self, callback, *args):
+        self.calls.put((callback, args))
+
+    def _drain(self):
+        deadline = time.perf_counter() + self.budget
+        while time.perf_counter() < deadline:
+            try:
+                callback, args = self.calls.get_nowait()
+            except queue.Empty:
+                break
+            callback(*args)
+        self.root.after(self.poll_ms, self._drain)
 
 class FileSystemExplorerApp:
     def __init__(self, root):
         self.root = root
         self.root.title("🌿 File System Explorer")
-        self.storage = StorageAllocator(100)
+        self.storage = None  # opened on a worker thread, see open_default_volume
+        self.metadata = MetadataCache()
+        self.loader = DirectoryLoader(root, self.metadata)
+        self.virtual = {}
+        self.listed = {}
+        self.watcher = DirectoryWatcher()
+        self.watched = {}  # directory path -> tree node
+        self.virtual_sync_pending = False
+        self.ui = UiQueue(root)
+        threading.Thread(target=self.open_default_volume, name='open-volume', daemon=True).start()
+        self.checkpoint_after = None
+        self.disk_usage = DiskUsage()
+        self.unsized = []  # (item, path) of files waiting for their size
+        self.sort_by = 'name'
+        self.index = None
+        self.index_cancelled = threading.Event()
+        self.search_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='search')
+        self.search_after = None
+        self.search_generation = 0
+        self.search_results = []
+        self.preview_after = None
         
         # Set window icon
         try:
@@ -131,12 +372,11 @@ class FileSystemExplorerApp:
             'create_dir': self.create_icon('#A3BE8C', '📁'),
             'delete': self.create_icon('#BF616A', '🗑️'),
             'rename': self.create_icon('#EBCB8B', '✏️'),
+            'copy': self.create_icon('#88C0D0', '📋'),
+            'move': self.create_icon('#D08770', '📦'),
             'details': self.create_icon('#81A1C1', '🔎'),
             'permissions': self.create_icon('#B48EAD', '🔐'),
             'modify_perms': self.create_icon('#B48EAD', '🛠️'),
-            'allocate': self.create_icon('#8FBCBB', '➕'),
-            'deallocate': self.create_icon('#D08770', '➖'),
-            'storage_map': self.create_icon('#81A1C1', '🗺️')
         }
 
         # ===== Main Layout =====
@@ -150,32 +390,82 @@ class FileSystemExplorerApp:
         self.storage_tab = ttk.Frame(self.notebook)
         self.notebook.add(self.explorer_tab, text="📂 File Explorer")
         self.notebook.add(self.storage_tab, text="💾 Storage Allocator")
+        # The Storage tab is only built the first time it is shown
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
 
         # === File Explorer Tab ===
         self.explorer_tab.columnconfigure(0, weight=3)
         self.explorer_tab.columnconfigure(1, weight=1)
-        self.explorer_tab.rowconfigure(0, weight=1)
+        self.explorer_tab.rowconfigure(2, weight=1)
+
+        # Search box over the path index
+        search_frame = ttk.Frame(self.explorer_tab)
+        search_frame.grid(row=0, column=0, sticky="ew", padx=(10, 5), pady=(10, 0))
+        ttk.Label(search_frame, text="🔍").pack(side=tk.LEFT, padx=(0, 5))
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add('write', lambda *args: self.schedule_search())
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
+        search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        search_entry.bind('<Return>', lambda e: self.reveal_result(0))
+        search_entry.bind('<Escape>', lambda e: self.search_var.set(''))
+        self.search_mode = tk.StringVar(value=SEARCH_MODES[0])
+        mode_box = ttk.Combobox(search_frame, textvariable=self.search_mode, values=SEARCH_MODES,
+                                state='readonly', width=10)
+        mode_box.pack(side=tk.RIGHT, padx=(5, 0))
+        mode_box.bind('<<ComboboxSelected>>', lambda e: self.schedule_search())
 
-        # Treeview with scrollbar
-        tree_frame = ttk.Frame(self.explorer_tab)
-        tree_frame.grid(row=0, column=0, sticky="nsew", padx=(10, 5), pady=10)
+        # Matches, shown only while there is a query
+        self.results_frame = ttk.Frame(self.explorer_tab)
+        self.results_frame.grid(row=1, column=0, sticky="nsew", padx=(10, 5), pady=(5, 0))
+        self.results_list = tk.Listbox(self.results_frame, height=8, activestyle='none',
+                                       bg=self.text_bg, fg=self.text_fg, borderwidth=0,
+                                       selectbackground=self.colors['highlight'],
+                                       font=('Segoe UI', 10))
+        self.results_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        results_scroll = ttk.Scrollbar(self.results_frame, command=self.results_list.yview)
+        results_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.results_list.config(yscrollcommand=results_scroll.set)
+        self.results_list.bind('<Double-Button-1>', lambda e: self.reveal_result())
+        self.results_list.bind('<Return>', lambda e: self.reveal_result())
+        self.results_frame.grid_remove()
 
-        self.tree = ttk.Treeview(tree_frame)
+        # Treeview with scrollbar, above a preview of the selected file
+        panes = ttk.PanedWindow(self.explorer_tab, orient=tk.VERTICAL)
+        panes.grid(row=2, column=0, sticky="nsew", padx=(10, 5), pady=10)
+        tree_frame = ttk.Frame(panes)
+        panes.add(tree_frame, weight=3)
+
+        # 'path' and 'bytes' are hidden: values[0] is an item's full path
+        self.tree = ttk.Treeview(tree_frame, columns=('path', 'size', 'bytes'), displaycolumns=('size',))
+        self.tree.heading('#0', text="Name", command=lambda: self.sort_tree('name'))
+        self.tree.heading('size', text="Size", command=lambda: self.sort_tree('size'))
+        self.tree.column('size', width=100, anchor=tk.E, stretch=False)
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         self.tree.bind('<<TreeviewOpen>>', self.on_open)
+        self.tree.bind('<<TreeviewClose>>', self.on_close)
+        self.tree.bind('<<TreeviewSelect>>', self.on_select)
+
+        self.tree_scroll = ttk.Scrollbar(tree_frame, command=self.tree.yview)
+        self.tree_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.config(yscrollcommand=self.on_tree_scroll)
 
-        scroll = ttk.Scrollbar(tree_frame, command=self.tree.yview)
-        scroll.pack(side=tk.RIGHT, fill=tk.Y)
-        self.tree.config(yscrollcommand=scroll.set)
+        self.preview = PreviewPane(panes, self.colors, self.ui.post)
+        panes.add(self.preview, weight=2)
 
         root_path = os.path.abspath('.')
-        root_node = self.tree.insert('', 'end', text=root_path, open=True, 
-                                   image=self.icons['folder'], values=[root_path])
-        self.populate_tree(root_node, root_path)
+        self.root_node = self.tree.insert('', 'end', text=root_path, open=True, 
+                                   image=self.icons['folder'], values=[root_path, '', ''])
+        self.populate_tree(self.root_node, root_path)
+
+        self.status = ttk.Label(self.explorer_tab, text="", foreground=self.colors['text_secondary'])
+        self.status.grid(row=3, column=0, columnspan=2, sticky="ew", padx=10, pady=(0, 5))
+        # Index once the window is up, so the scan doesn't compete with startup
+        self.root.after(INDEX_DELAY_MS, lambda: threading.Thread(
+            target=self.build_index, args=(root_path,), name='path-index', daemon=True).start())
 
         # Actions Panel
         ops_frame = ttk.LabelFrame(self.explorer_tab, text="🛠️ File Operations")
-        ops_frame.grid(row=0, column=1, sticky="nsew", padx=(5, 10), pady=10)
+        ops_frame.grid(row=0, column=1, rowspan=3, sticky="nsew", padx=(5, 10), pady=10)
         ops_frame.columnconfigure(0, weight=1)
         
         buttons = [
@@ -183,6 +473,8 @@ class FileSystemExplorerApp:
             ("Create Directory", self.create_dir, 'create_dir'),
             ("Delete", self.delete_item, 'delete'),
             ("Rename", self.rename_item, 'rename'),
+            ("Copy To…", self.copy_items, 'copy'),
+            ("Move To…", lambda: self.copy_items(move=True), 'move'),
             ("Show Details", self.show_details, 'details'),
             ("Show Permissions", self.show_permissions, 'permissions'),
             ("Modify Permissions", self.modify_permissions, 'modify_perms')
@@ -194,20 +486,43 @@ class FileSystemExplorerApp:
             btn.grid(row=row, column=0, sticky="ew", padx=5, pady=4)
             ops_frame.rowconfigure(row, weight=1)
 
-        # === Storage Tab ===
+        self.root.after(WATCH_POLL_MS, self.apply_watch_events)
+
+        # Configure root window resizing
+        root.minsize(800, 600)
+        root.geometry("1000x650")
+
+    def on_tab_changed(self, event=None):
+        if (self.notebook.select() == str(self.storage_tab) and self.storage is not None
+                and not self.storage_tab.winfo_children()):
+            self.build_storage_tab()
+
+    def build_storage_tab(self):
+        self.icons.update({
+            'allocate': self.create_icon('#8FBCBB', '➕'),
+            'deallocate': self.create_icon('#D08770', '➖'),
+            'storage_map': self.create_icon('#81A1C1', '🗺️'),
+        })
         self.storage_tab.columnconfigure(0, weight=1)
-        self.storage_tab.rowconfigure(1, weight=1)
+        self.storage_tab.rowconfigure(2, weight=1)
 
         # Header
         header = ttk.Frame(self.storage_tab)
         header.grid(row=0, column=0, sticky="ew", padx=10, pady=(10, 0))
-        ttk.Label(header, text="💾 Storage Allocation (First Fit)", 
-                 font=("Segoe UI", 12, "bold")).pack(side=tk.LEFT)
+        self.storage_title = ttk.Label(header, text=f"💾 Storage Allocation ({self.storage.strategy.name})", 
+                                       font=("Segoe UI", 12, "bold"))
+        self.storage_title.pack(side=tk.LEFT)
+        self.strategy_var = tk.StringVar(value=self.storage.strategy.name)
+        strategy_box = ttk.Combobox(header, textvariable=self.strategy_var, values=list(STRATEGIES),
+                                    state='readonly', width=14)
+        strategy_box.pack(side=tk.RIGHT)
+        strategy_box.bind('<<ComboboxSelected>>', self.change_strategy)
+        ttk.Label(header, text="Strategy:").pack(side=tk.RIGHT, padx=5)
         
         # Buttons
         btn_frame = ttk.Frame(self.storage_tab)
         btn_frame.grid(row=1, column=0, sticky="ew", padx=10, pady=10)
-        for i in range(3): btn_frame.columnconfigure(i, weight=1)
+        for i in range(6): btn_frame.columnconfigure(i, weight=1)
 
         ttk.Button(btn_frame, text="Allocate Blocks", command=self.allocate_blocks,
                   image=self.icons['allocate'], compound=tk.LEFT).grid(row=0, column=0, padx=5, sticky="ew")
@@ -215,14 +530,24 @@ class FileSystemExplorerApp:
                   image=self.icons['deallocate'], compound=tk.LEFT).grid(row=0, column=1, padx=5, sticky="ew")
         ttk.Button(btn_frame, text="Show Allocation Map", command=self.show_storage_map,
                   image=self.icons['storage_map'], compound=tk.LEFT).grid(row=0, column=2, padx=5, sticky="ew")
+        ttk.Button(btn_frame, text="Zoom In", command=lambda: self.storage_map.zoom(1)).grid(
+            row=0, column=3, padx=5, sticky="ew")
+        ttk.Button(btn_frame, text="Zoom Out", command=lambda: self.storage_map.zoom(-1)).grid(
+            row=0, column=4, padx=5, sticky="ew")
+        ttk.Button(btn_frame, text="Open Volume…", command=self.open_volume).grid(
+            row=0, column=5, padx=5, sticky="ew")
+
+        # Visual map (Ctrl+wheel zooms around the pointer)
+        self.storage_map = AllocationMap(self.storage_tab, self.storage, self.colors)
+        self.storage_map.grid(row=2, column=0, sticky="nsew", padx=10, pady=(0, 10))
 
-        # Text output for storage map
+        # Log of storage operations
         output_frame = ttk.Frame(self.storage_tab)
-        output_frame.grid(row=2, column=0, sticky="nsew", padx=10, pady=(0, 10))
+        output_frame.grid(row=3, column=0, sticky="nsew", padx=10, pady=(0, 10))
         output_frame.columnconfigure(0, weight=1)
         output_frame.rowconfigure(0, weight=1)
         
-        self.storage_output = tk.Text(output_frame, height=10, font=("Consolas", 11), 
+        self.storage_output = tk.Text(output_frame, height=6, font=("Consolas", 11), 
                                      wrap=tk.NONE, bg=self.text_bg, fg=self.text_fg,
                                      insertbackground=self.colors['text'],
                                      selectbackground=self.colors['highlight'])
@@ -232,108 +557,733 @@ class FileSystemExplorerApp:
         text_scroll.grid(row=0, column=1, sticky="ns")
         self.storage_output.config(yscrollcommand=text_scroll.set)
 
-        # Configure root window resizing
-        root.minsize(800, 600)
-        root.geometry("1000x650")
-        
     def create_icon(self, color, emoji=None):
-        """Create a more sophisticated icon with emoji overlay"""
-        icon = Image.new('RGBA', (24, 24), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(icon)
-        
-        # Draw background circle
-        draw.ellipse([2, 2, 22, 22], fill=color)
-        
-        # Add emoji if provided
-        if emoji:
-            try:
-                font = ImageFont.truetype("seguiemj.ttf", 16)
-            except:
-                font = ImageFont.load_default()
-            
-            # Get text bounding box using textbbox (replaces deprecated textsize)
-            bbox = draw.textbbox((0, 0), emoji, font=font)
-            w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
-            draw.text(((24-w)/2, (24-h)/2-2), emoji, font=font, embedded_color=True)
-        
-        return ImageTk.PhotoImage(icon)
+        """Circle icon with an emoji overlay, from the on-disk PNG cache"""
+        return icon_cache.load_icon(color, emoji, self.root)
+
+    def measure_startup(self):
+        """Print seconds from process start to imports done, app built, first
+        paint and the root folder listed as one JSON line, then quit"""
+        marks = {'imports': IMPORTED - STARTED, 'constructed': time.perf_counter() - STARTED}
+
+        def painted(event):
+            self.tree.unbind('<Expose>')
+            self.root.after_idle(lambda: marks.setdefault('first_paint', time.perf_counter() - STARTED))
+
+        def check():
+            if 'root_listed' not in marks and (self.root_node in self.listed or self.root_node in self.virtual):
+                marks['root_listed'] = time.perf_counter() - STARTED
+            if 'first_paint' in marks and 'root_listed' in marks:
+                print(json.dumps({**{k: round(v, 4) for k, v in marks.items()},
+                                  'icon_cache_misses': icon_cache.misses}), flush=True)
+                self.root.destroy()
+                return
+            self.root.after(5, check)
+
+        self.tree.bind('<Expose>', painted)
+        check()
+
+    def insert_entry(self, parent, index, name, full_path, is_dir):
+        img = self.icons['folder'] if is_dir else self.icons['file']
+        size = self.disk_usage.total(full_path) if is_dir else None
+        values = [full_path, format_size(size.bytes), size.bytes] if size else [full_path, '', '']
+        node = self.tree.insert(parent, index, text=name, image=img, values=values)
+        if is_dir:
+            self.tree.insert(node, 'end', text=LOADING_TEXT)
+        else:
+            self.queue_size(node, full_path)
+        return node
 
     def populate_tree(self, parent, path):
+        """Relist `path` under `parent` in the background; entries show up in
+        scan order and are sorted in one pass once the listing completes.
+        Past VIRTUAL_THRESHOLD entries the rest are only collected, and the
+        node switches to a windowed view of a DirectoryModel when done."""
+        self.virtual.pop(parent, None)
+        self.listed.pop(parent, None)
         self.tree.delete(*self.tree.get_children(parent))
-        try:
-            for item in sorted(os.listdir(path), key=lambda x: x.lower()):
-                full_path = os.path.join(path, item)
-                img = self.icons['folder'] if os.path.isdir(full_path) else self.icons['file']
-                node = self.tree.insert(parent, 'end', text=item, image=img, values=[full_path])
-                if os.path.isdir(full_path):
-                    self.tree.insert(node, 'end')  # dummy child
-        except Exception as e:
-            pass
+        self.watched[path] = parent
+        self.watcher.watch(path)
+        placeholder = self.tree.insert(parent, 'end', text=LOADING_TEXT)
+        loaded = []
+        nodes = []
+
+        def add_batch(batch):
+            if not self.tree.exists(parent):
+                self.loader.cancel(parent)
+                return
+            loaded.extend(batch)
+            for key, name, full_path, is_dir in batch[:VIRTUAL_THRESHOLD - len(nodes)]:
+                nodes.append((key, name, self.insert_entry(parent, 'end', name, full_path, is_dir)))
+
+        def finish(error):
+            if not self.tree.exists(parent):
+                return
+            self.tree.delete(placeholder)
+            if len(loaded) <= VIRTUAL_THRESHOLD:
+                nodes.sort()
+                self.tree.set_children(parent, *[node for _, _, node in nodes])
+                self.listed[parent] = _ListedChildren([(key, name) for key, name, _ in nodes],
+                                                      {name: node for _, name, node in nodes})
+                if self.sort_by == 'size':
+                    self.order_children(parent)
+                return
+            self.tree.delete(*[node for _, _, node in nodes])
+            self.virtual[parent] = _VirtualChildren(DirectoryModel(path, loaded))
+            loaded.clear()
+            self.set_virtual_window(parent, 0, VIRTUAL_WINDOW)
+
+        self.loader.load(parent, path, add_batch, finish)
+
+    # === Virtualized children ===
+    def set_virtual_window(self, node, lo, hi, anchor=None):
+        """Materialize model entries [lo, hi) of a virtual node, reusing the
+        items already shown. If `anchor` is an item inside the window, the
+        view is scrolled so the rows added or removed above it don't move it."""
+        view = self.virtual[node]
+        model = view.model
+        lo, hi = max(0, lo), min(len(model), hi)
+        anchor_index = self.virtual_position(node, anchor) if anchor else None
+        if anchor_index is not None and not view.lo <= anchor_index < view.hi:
+            anchor_index = None
+        shift = 0
+
+        for marker in (view.above, view.below):
+            if marker and self.tree.exists(marker):
+                self.tree.delete(marker)
+        if view.above and anchor_index is not None:
+            shift -= 1
+        view.above = view.below = None
+
+        dropped = [i for i in view.items if not lo <= i < hi]
+        for i in dropped:
+            if anchor_index is not None and i < anchor_index:
+                shift -= 1
+            del view.indexes[view.items.pop(i)]
+        self.tree.delete(*[item for item in self.tree.get_children(node) if item not in view.indexes])
+
+        if view.items:
+            front = range(lo, max(lo, view.lo))
+            back = range(max(lo, view.hi), hi)
+        else:
+            front, back = range(0), range(lo, hi)
+        for position, i in enumerate(front):
+            view.items[i] = self.insert_entry(node, position, model.name(i), model.path_of(i), model.is_dir(i))
+            if anchor_index is not None:
+                shift += 1
+        for i in back:
+            view.items[i] = self.insert_entry(node, 'end', model.name(i), model.path_of(i), model.is_dir(i))
+        view.indexes = {item: i for i, item in view.items.items()}
+        view.lo, view.hi = lo, hi
+
+        if lo > 0:
+            view.above = self.tree.insert(node, 0, text=f"▲ {lo:,} more above")
+            if anchor_index is not None:
+                shift += 1
+        if hi < len(model):
+            view.below = self.tree.insert(node, 'end', text=f"▼ {len(model) - hi:,} more below")
+        if shift:
+            self.tree.yview_scroll(shift, 'units')
+
+    def virtual_position(self, node, item):
+        """Model index a visible row stands for within a virtual node, or None
+        if the row is outside it. The markers map just past the window."""
+        view = self.virtual[node]
+        while item:
+            if item in view.indexes:
+                return view.indexes[item]
+            if item == view.above:
+                return view.lo - 1
+            if item == view.below:
+                return view.hi
+            if item == node:
+                return None
+            item = self.tree.parent(item)
+        return None
+
+    def on_tree_scroll(self, first, last):
+        self.tree_scroll.set(first, last)
+        if self.virtual and not self.virtual_sync_pending:
+            self.virtual_sync_pending = True
+            self.root.after_idle(self.sync_virtual_windows)
+
+    def sync_virtual_windows(self):
+        """Slide each open virtual node's window to follow the viewport"""
+        self.virtual_sync_pending = False
+        # The first few pixels may be the heading row
+        top = ''
+        for y in range(1, 64, 4):
+            top = self.tree.identify_row(y)
+            if top:
+                break
+        bottom = self.tree.identify_row(self.tree.winfo_height() - 2)
+        for node in list(self.virtual):
+            view = self.virtual[node]
+            if not self.tree.exists(node):
+                del self.virtual[node]
+                continue
+            if not self.tree.item(node, 'open'):
+                continue
+            first = self.virtual_position(node, top)
+            last = self.virtual_position(node, bottom) if bottom else None
+            if first is None and last is None:
+                continue
+            if first is None:
+                first = view.lo - 1 if view.above else view.lo
+            if last is None:
+                last = view.hi if view.below else view.hi - 1
+            near_top = view.lo > 0 and first < view.lo + VIRTUAL_MARGIN // 2
+            near_bottom = view.hi < len(view.model) and last >= view.hi - VIRTUAL_MARGIN // 2
+            if near_top or near_bottom:
+                lo = max(0, first - VIRTUAL_MARGIN)
+                hi = max(last + 1 + VIRTUAL_MARGIN, lo + VIRTUAL_WINDOW)
+                self.set_virtual_window(node, lo, hi, anchor=top)
+
+    def reset_node(self, node):
+        """Drop a node's (partial) children so the next open lists it again"""
+        self.tree.delete(*self.tree.get_children(node))
+        self.tree.insert(node, 'end', text=LOADING_TEXT)
 
     def on_open(self, event):
         node = self.tree.focus()
         path = self.tree.item(node)['values'][0]
+        # Opening a node supersedes loads elsewhere, except along its own path
+        keep = set()
+        ancestor = node
+        while ancestor:
+            keep.add(ancestor)
+            ancestor = self.tree.parent(ancestor)
+        for other in self.loader.pending():
+            if other not in keep and self.loader.cancel(other) and self.tree.exists(other):
+                self.reset_node(other)
+                self.tree.item(other, open=False)
         self.populate_tree(node, path)
 
+    def on_close(self, event):
+        node = self.tree.focus()
+        if self.loader.cancel(node):
+            self.reset_node(node)
+        values = self.tree.item(node)['values']
+        if values:
+            self.unwatch_tree(values[0])
+
+    # === Sizes ===
+    def on_select(self, event=None):
+        # Wait for the selection to settle so arrowing through files doesn't map each one
+        if self.preview_after is not None:
+            self.root.after_cancel(self.preview_after)
+        self.preview_after = self.root.after(PREVIEW_DELAY_MS, self.preview_selected)
+
+    def preview_selected(self):
+        """Show the selected file in the preview pane when exactly one is selected"""
+        self.preview_after = None
+        selection = self.tree.selection()
+        values = self.tree.item(selection[0])['values'] if len(selection) == 1 else None
+        if values and os.path.isfile(values[0]):
+            self.preview.show(values[0])
+        else:
+            self.preview.clear("Select a file to preview it")
+
+    def release_preview(self, paths):
+        """Stop previewing the file if it is one of `paths` or inside one:
+        Windows won't delete, rename or move a file that is held open"""
+        shown = self.preview.path
+        if shown is not None and any(shown == path or shown.startswith(os.path.join(path, ''))
+                                     for path in paths):
+            if self.preview_after is not None:
+                self.root.after_cancel(self.preview_after)
+                self.preview_after = None
+            self.preview.clear("Select a file to preview it")
+
+    def queue_size(self, item, path):
+        self.unsized.append((item, path))
+        if len(self.unsized) == 1:
+            self.root.after_idle(self.start_size_fill)
+
+    def start_size_fill(self):
+        jobs, self.unsized = self.unsized, []
+        self.loader.pool.submit(self.stat_sizes, jobs)
+
+    def stat_sizes(self, jobs):
+        # Worker thread: stat through the shared cache, post results in batches
+        batch = []
+        for item, path in jobs:
+            try:
+                batch.append((item, self.metadata.stat(path).st_size))
+            except OSError:
+                continue
+            if len(batch) >= 500:
+                self.ui.post(self.show_sizes, batch)
+                batch = []
+        if batch:
+            self.ui.post(self.show_sizes, batch)
+
+    def show_sizes(self, sizes):
+        parents = set()
+        for item, size in sizes:
+            if self.tree.exists(item):
+                self.tree.set(item, 'size', format_size(size))
+                self.tree.set(item, 'bytes', size)
+                parents.add(self.tree.parent(item))
+        if self.sort_by == 'size':
+            for parent in parents:
+                self.order_children(parent)
+
+    def show_directory_sizes(self, path):
+        """Fill the size column for `path` and its child directories from the last du walk"""
+        node = self.watched.get(path)
+        items = []
+        if node is not None and self.tree.exists(node):
+            items.append(node)
+            items.extend(self.tree.get_children(node))
+        for item in items:
+            values = self.tree.item(item)['values']
+            usage = self.disk_usage.total(values[0]) if values else None
+            if usage is not None:
+                self.tree.set(item, 'size', format_size(usage.bytes))
+                self.tree.set(item, 'bytes', usage.bytes)
+        if node is not None and self.sort_by == 'size':
+            self.order_children(node)
+
+    def sort_tree(self, column):
+        self.sort_by = column
+        self.tree.heading('#0', text="Name ▲" if column == 'name' else "Name")
+        self.tree.heading('size', text="Size ▼" if column == 'size' else "Size")
+        for node in list(self.listed):
+            if self.tree.exists(node):
+                self.order_children(node)
+            else:
+                del self.listed[node]
+
+    def order_children(self, node):
+        """Reorder a listed node's children by name, or largest first by size.
+        Virtual nodes always stay in name order."""
+        listed = self.listed.get(node)
+        if listed is None:
+            return
+        items = [listed.items[name] for _, name in listed.keys]
+        if self.sort_by == 'size':
+            sizes = {item: self.tree.set(item, 'bytes') for item in items}
+            items.sort(key=lambda item: -int(sizes[item]) if sizes[item] != '' else 1)
+        self.tree.set_children(node, *items)
+
+    # === Live updates ===
+    def unwatch_tree(self, path):
+        prefix = os.path.join(path, '')
+        for watched in [p for p in self.watched if p == path or p.startswith(prefix)]:
+            del self.watched[watched]
+            self.watcher.unwatch(watched)
+
+    def apply_watch_events(self):
+        for path, changes in self.watcher.drain().items():
+            self.note_changes(path, changes)
+        self.root.after(WATCH_POLL_MS, self.apply_watch_events)
+
+    def note_changes(self, path, changes):
+        """Apply changes in directory `path` to its tree node, if it is listed"""
+        node = self.watched.get(path)
+        if node is not None and self.tree.exists(node) and node in self.loader.pending():
+            # The names are forgotten once, when the changes come back after the load
+            self.metadata.invalidate(path)
+            self.watcher.requeue(path, changes)
+            return
+        self.invalidate_changes(path, changes)
+        if node is None:
+            return
+        if not self.tree.exists(node):
+            self.unwatch_tree(path)
+            return
+        self.disk_usage.invalidate(path)
+        if changes.rescan:
+            self.populate_tree(node, path)
+        elif node in self.virtual:
+            self.apply_virtual_changes(node, changes)
+        elif node in self.listed:
+            self.apply_listed_changes(node, path, changes)
+            if self.sort_by == 'size':
+                self.order_children(node)
+
+    def invalidate_changes(self, path, changes):
+        """Drop cached metadata for the names in `changes`; only names that
+        went away can have anything cached beneath them"""
+        for name in [*changes.removed, *changes.renamed]:
+            self.metadata.invalidate(os.path.join(path, name), recursive=True)
+        for name in [*changes.renamed.values(), *changes.added]:
+            self.metadata.invalidate(os.path.join(path, name))
+
+    def apply_listed_changes(self, node, path, changes):
+        listed = self.listed[node]
+        for name in changes.removed:
+            self.remove_child(node, path, name)
+        for old, new in changes.renamed.items():
+            item = listed.items.pop(old, None)
+            if item is None:
+                if new not in listed.items:
+                    self.add_child(node, path, new, self.is_dir(os.path.join(path, new)))
+                continue
+            del listed.keys[bisect_left(listed.keys, (old.lower(), old))]
+            self.remove_child(node, path, new)
+            key = (new.lower(), new)
+            index = bisect_left(listed.keys, key)
+            listed.keys.insert(index, key)
+            listed.items[new] = item
+            self.tree.move(item, node, index)
+            self.tree.item(item, text=new)
+            self.tree.set(item, 'path', os.path.join(path, new))
+            # Loaded children still carry paths under the old name
+            if self.tree.item(item, 'open') or item in self.listed or item in self.virtual:
+                self.unwatch_tree(os.path.join(path, old))
+                self.reset_node(item)
+                self.tree.item(item, open=False)
+        for name, is_dir in changes.added.items():
+            if name not in listed.items:
+                self.add_child(node, path, name, is_dir)
+
+    def add_child(self, node, path, name, is_dir):
+        listed = self.listed[node]
+        key = (name.lower(), name)
+        index = bisect_left(listed.keys, key)
+        listed.keys.insert(index, key)
+        listed.items[name] = self.insert_entry(node, index, name, os.path.join(path, name), is_dir)
+
+    def remove_child(self, node, path, name):
+        listed = self.listed[node]
+        item = listed.items.pop(name, None)
+        if item is not None:
+            del listed.keys[bisect_left(listed.keys, (name.lower(), name))]
+            self.unwatch_tree(os.path.join(path, name))
+            self.tree.delete(item)
+
+    def apply_virtual_changes(self, node, changes):
+        view = self.virtual[node]
+        model = view.model
+        removed = set(changes.removed)
+        added = dict(changes.added)
+        for old, new in changes.renamed.items():
+            i = model.find(old)
+            removed.add(old)
+            added[new] = model.is_dir(i) if i != -1 else self.is_dir(os.path.join(model.path, new))
+        for name in removed:
+            self.unwatch_tree(os.path.join(model.path, name))
+        view.model = new_model = model.with_changes(removed, added)
+        size = max(view.hi - view.lo, VIRTUAL_WINDOW)
+        # Keep the rows of unchanged names, open folders and selection with
+        # them, under their shifted indexes; drop the rest
+        kept, dropped = {}, []
+        for i, item in view.items.items():
+            name = model.name(i)
+            if name in removed or name in added:
+                dropped.append(item)
+            else:
+                kept[new_model.find(name)] = item
+        lo = min(kept, default=min(view.lo, max(0, len(new_model) - size)))
+        hi = min(max(kept, default=lo - 1) + 1, lo + size)
+        dropped += [kept.pop(i) for i in [i for i in kept if i >= hi]]
+        self.tree.delete(*dropped)
+        # Fill the gaps left by added names, top to bottom so each position counts the rows before it
+        first = 1 if view.above and self.tree.exists(view.above) else 0
+        for i in range(lo, hi):
+            if i not in kept:
+                kept[i] = self.insert_entry(node, first + i - lo, new_model.name(i), new_model.path_of(i),
+                                            new_model.is_dir(i))
+        view.items = kept
+        view.indexes = {item: i for i, item in kept.items()}
+        view.lo, view.hi = lo, hi
+        self.set_virtual_window(node, lo, lo + size)
+
+    def is_dir(self, path):
+        try:
+            return stat.S_ISDIR(self.metadata.stat(path).st_mode)
+        except OSError:
+            return False
+
+    def update_cache_status(self):
+        stats = self.metadata.stats()
+        self.status.config(text=f"Metadata cache: {stats['hit_rate']:.0%} hits "
+                                f"({stats['hits']:,} of {stats['hits'] + stats['misses']:,} lookups), "
+                                f"{stats['entries']:,} entries")
+
+    # === Search ===
+    def build_index(self, root_path):
+        # Worker thread: open the index and bring it up to date
+        try:
+            index = PathIndex(root_path)
+            self.ui.post(self.set_index, index)
+            index.refresh(lambda visited, relisted: self.ui.post(
+                self.show_status, f"Indexing: {visited:,} directories checked, {relisted:,} re-listed"),
+                self.index_cancelled)
+            if not self.index_cancelled.is_set():
+                self.ui.post(self.show_status, f"Index: {index.count():,} paths under {root_path}")
+                self.ui.post(self.schedule_search)
+        except (OSError, UnicodeError, sqlite3.Error) as e:
+            self.ui.post(self.show_status, f"Search index unavailable: {e}")
+
+    def set_index(self, index):
+        self.index = index
+        self.schedule_search()
+
+    def show_status(self, text):
+        self.status.config(text=text)
+
+    def schedule_search(self):
+        """Query the index once typing pauses for SEARCH_DELAY_MS"""
+        if self.search_after is not None:
+            self.root.after_cancel(self.search_after)
+        self.search_after = self.root.after(SEARCH_DELAY_MS, self.start_search)
+
+    def start_search(self):
+        self.search_after = None
+        self.search_generation += 1
+        text = self.search_var.get().strip()
+        if not text:
+            self.show_results(self.search_generation, [], 0.0)
+            return
+        if self.index is not None:
+            self.search_pool.submit(self.run_search, self.search_generation, text, self.search_mode.get())
+
+    def run_search(self, generation, text, mode):
+        # Search thread: results older than the latest query are dropped on arrival
+        if generation != self.search_generation:
+            return
+        started = time.perf_counter()
+        try:
+            results = self.index.search(text, mode, SEARCH_LIMIT)
+        except sqlite3.Error:
+            results = []
+        self.ui.post(self.show_results, generation, results, time.perf_counter() - started)
+
+    def show_results(self, generation, results, elapsed):
+        if generation != self.search_generation:
+            return
+        self.search_results = results
+        self.results_list.delete(0, 'end')
+        if not self.search_var.get().strip():
+            self.results_frame.grid_remove()
+            return
+        self.results_list.insert('end', *[path + os.sep if is_dir else path for path, is_dir in results])
+        self.results_frame.grid()
+        more = "+" if len(results) == SEARCH_LIMIT else ""
+        self.status.config(text=f"{len(results):,}{more} matches in {elapsed * 1000:.1f} ms")
+
+    def reveal_result(self, position=None):
+        if position is None:
+            selection = self.results_list.curselection()
+            position = selection[0] if selection else 0
+        if position < len(self.search_results):
+            self.reveal(self.search_results[position][0])
+
+    def reveal(self, path):
+        """Select `path` in the tree, materializing only the nodes on its way:
+        listed and virtual ancestors are used as they are, anything else gets
+        just the one child it needs."""
+        node = self.root_node
+        relative = os.path.relpath(path, self.tree.item(node)['values'][0])
+        if relative.startswith(os.pardir):
+            return
+        for name in relative.split(os.sep) if relative != os.curdir else []:
+            node = self.reveal_child(node, name)
+            if node is None:
+                messagebox.showwarning("Not Found", f"{path}\nno longer exists.", parent=self.root)
+                return
+        self.tree.see(node)
+        self.tree.selection_set(node)
+        self.tree.focus(node)
+
+    def reveal_child(self, node, name):
+        """Item for `name` under `node`, which gets opened; None if it is gone"""
+        self.tree.item(node, open=True)
+        if node in self.virtual:
+            view = self.virtual[node]
+            i = view.model.find(name)
+            if i == -1:
+                return None
+            if i not in view.items:
+                self.set_virtual_window(node, i - VIRTUAL_WINDOW // 2, i + VIRTUAL_WINDOW // 2)
+            return view.items[i]
+        if node in self.listed:
+            return self.listed[node].items.get(name)
+        # Unlisted (or still loading): show the one child, and leave relisting
+        # the rest to the next time the node is opened
+        for item in self.tree.get_children(node):
+            if self.tree.item(item, 'text') == name and self.tree.item(item)['values']:
+                return item
+        full_path = os.path.join(self.tree.item(node)['values'][0], name)
+        if not os.path.lexists(full_path):
+            return None
+        if self.loader.cancel(node):
+            self.unwatch_tree(os.path.dirname(full_path))
+        self.tree.delete(*[item for item in self.tree.get_children(node) if not self.tree.item(item)['values']])
+        item = self.insert_entry(node, 'end', name, full_path, self.is_dir(full_path))
+        self.tree.insert(node, 'end', text=PARTIAL_TEXT)
+        return item
+
     def get_selected_path(self):
         selected = self.tree.focus()
-        if not selected:
+        values = self.tree.item(selected)['values'] if selected else None
+        if not values:
             messagebox.showwarning("No Selection", "Please select a file or folder first.")
             return None
-        return self.tree.item(selected)['values'][0]
+        return values[0]
+
+    def get_selected_paths(self):
+        """Paths of every selected item (Ctrl/Shift-click selects several)"""
+        paths = []
+        for item in self.tree.selection():
+            values = self.tree.item(item)['values']
+            if values:
+                paths.append(values[0])
+        if not paths:
+            messagebox.showwarning("No Selection", "Please select a file or folder first.")
+        return paths
 
     # === File Operations ===
+    def note_created(self, path, is_dir):
+        changes = DirectoryChanges()
+        changes.add(os.path.basename(path), is_dir)
+        self.note_changes(os.path.dirname(path), changes)
+
     def create_file(self):
         path = self.get_selected_path()
-        if path and os.path.isdir(path):
+        if path and self.is_dir(path):
             name = simpledialog.askstring("Create File", "Enter file name:", parent=self.root)
             if name:
                 try:
-                    open(os.path.join(path, name), 'w').close()
-                    self.populate_tree(self.tree.focus(), path)
+                    target = os.path.join(path, name)
+                    fs_core.create_file(target)
+                    self.note_created(target, False)
                 except Exception as e:
                     messagebox.showerror("Error", str(e), parent=self.root)
 
     def create_dir(self):
         path = self.get_selected_path()
-        if path and os.path.isdir(path):
+        if path and self.is_dir(path):
             name = simpledialog.askstring("Create Directory", "Enter directory name:", parent=self.root)
             if name:
                 try:
-                    os.mkdir(os.path.join(path, name))
-                    self.populate_tree(self.tree.focus(), path)
+                    target = os.path.join(path, name)
+                    fs_core.create_dir(target)
+                    self.note_created(target, True)
                 except Exception as e:
                     messagebox.showerror("Error", str(e), parent=self.root)
 
     def delete_item(self):
-        path = self.get_selected_path()
-        if path:
+        paths = self.get_selected_paths()
+        if paths:
+            listed = "\n".join(paths[:10]) + (f"\n… and {len(paths) - 10:,} more" if len(paths) > 10 else "")
             confirm = messagebox.askyesno("Confirm Delete", 
-                                        f"Are you sure you want to delete:\n{path}?",
+                                        f"Are you sure you want to delete:\n{listed}?",
                                         parent=self.root)
             if confirm:
-                try:
-                    if os.path.isdir(path):
-                        shutil.rmtree(path)
-                    else:
-                        os.remove(path)
-                    parent = self.tree.parent(self.tree.focus())
-                    parent_path = self.tree.item(parent)['values'][0]
-                    self.populate_tree(parent, parent_path)
-                except Exception as e:
-                    messagebox.showerror("Error", str(e), parent=self.root)
+                self.release_preview(paths)
+                job = BulkDelete(paths)
+                self.show_progress(job, "Deleting", lambda stats: (
+                    f"Removed {stats.files:,} files and {stats.dirs:,} folders ({format_size(stats.bytes)})\n"
+                    f"{stats.files_per_second:,.0f} files/s, {format_size(stats.bytes_per_second)}/s"),
+                    lambda: self.note_deleted(job.paths))
+
+    def copy_items(self, move=False):
+        paths = self.get_selected_paths()
+        if not paths:
+            return
+        destination = filedialog.askdirectory(parent=self.root, mustexist=True,
+                                              title="Move To" if move else "Copy To",
+                                              initialdir=os.path.dirname(paths[0]))
+        if not destination:
+            return
+        if move:
+            self.release_preview(paths)
+        job = BulkCopy(paths, destination, move=move)
+        verb = "Moved" if move else "Copied"
+
+        def describe(stats):
+            text = (f"{verb} {stats.files:,} of {job.total.files:,} files, "
+                    f"{format_size(stats.bytes)} of {format_size(job.total.bytes)}\n"
+                    f"{format_size(stats.bytes_per_second)}/s")
+            remaining = job.remaining_seconds(stats)
+            if remaining is not None:
+                text += f", about {int(remaining) // 60}:{int(remaining) % 60:02d} left"
+            return text
+
+        def finished():
+            for target in job.targets:
+                if os.path.lexists(target):
+                    self.note_created(target, self.is_dir(target))
+            if move:
+                self.note_deleted(job.sources)
+
+        self.show_progress(job, "Moving" if move else "Copying", describe, finished,
+                           lambda stats: stats.bytes / job.total.bytes if job.total.bytes else None)
+
+    def show_progress(self, job, title, describe, on_done, fraction=None):
+        """Progress window for a file_ops job running in the background; closing
+        it or pressing Cancel stops the job. describe(stats) gives the text and
+        fraction(stats), if given, how far along it is, or None while unknown."""
+        window = tk.Toplevel(self.root)
+        window.title(title)
+        window.configure(background=self.colors['background'])
+        window.transient(self.root)
+        label = ttk.Label(window, text=f"{title}…", justify=tk.LEFT, padding=15)
+        label.pack(fill=tk.BOTH, expand=True)
+        bar = ttk.Progressbar(window, mode='indeterminate', length=320, maximum=1.0)
+        bar.pack(padx=15)
+        bar.start(15)
+        button = ttk.Button(window, text="Cancel", command=job.cancel)
+        button.pack(pady=10)
+        window.bind('<Destroy>', lambda e: job.cancel() if e.widget is window else None)
+
+        def show(stats, done):
+            if done:
+                on_done()
+            if not window.winfo_exists():
+                return
+            text = describe(stats)
+            if stats.errors:
+                text += f"\nFailed: {stats.errors:,}"
+            progress = fraction(stats) if fraction is not None else None
+            if progress is not None and str(bar.cget('mode')) == 'indeterminate':
+                bar.stop()
+                bar.config(mode='determinate')
+            if progress is not None:
+                bar.config(value=min(progress, 1.0))
+            if not done:
+                label.config(text=text)
+                return
+            bar.stop()
+            bar.config(mode='determinate', value=1.0 if not stats.errors else 0)
+            heading = "Cancelled" if job.cancelled.is_set() else "Done"
+            failures = "".join(f"\n{path}: {getattr(error, 'strerror', None) or error}" for path, error in job.failures[:5])
+            label.config(text=f"{heading}. {text}{failures}")
+            button.config(text="Close", command=window.destroy)
+
+        def run():
+            stats = job.run(lambda partial: self.ui.post(show, partial, False))
+            self.ui.post(show, stats, True)
+
+        threading.Thread(target=run, name=title.lower(), daemon=True).start()
+
+    def note_deleted(self, paths):
+        for path in paths:
+            if not os.path.lexists(path):
+                changes = DirectoryChanges()
+                changes.remove(os.path.basename(path))
+                self.note_changes(os.path.dirname(path), changes)
 
     def rename_item(self):
         path = self.get_selected_path()
         if path:
             new_name = simpledialog.askstring("Rename", "Enter new name:", parent=self.root)
             if new_name:
-                new_path = os.path.join(os.path.dirname(path), new_name)
                 try:
-                    os.rename(path, new_path)
-                    parent = self.tree.parent(self.tree.focus())
-                    parent_path = self.tree.item(parent)['values'][0]
-                    self.populate_tree(parent, parent_path)
+                    is_dir = self.is_dir(path)
+                    self.release_preview([path])
+                    new_path = fs_core.rename(path, new_name)
+                    changes = DirectoryChanges()
+                    if os.path.dirname(new_path) == os.path.dirname(path):
+                        changes.rename(os.path.basename(path), os.path.basename(new_path), is_dir)
+                    else:
+                        changes.remove(os.path.basename(path))
+                        self.note_created(new_path, is_dir)
+                    self.note_changes(os.path.dirname(path), changes)
                 except Exception as e:
                     messagebox.showerror("Error", str(e), parent=self.root)
 
@@ -341,51 +1291,60 @@ class FileSystemExplorerApp:
         path = self.get_selected_path()
         if path:
             try:
-                if os.path.isfile(path):
-                    size = os.path.getsize(path)
-                    mod_time = os.path.getmtime(path)
-                    created_time = os.path.getctime(path)
-                    formatted_mod = datetime.fromtimestamp(mod_time).strftime('%Y-%m-%d %H:%M:%S')
-                    formatted_created = datetime.fromtimestamp(created_time).strftime('%Y-%m-%d %H:%M:%S')
+                st = self.metadata.stat(path, fresh=True)
+                listing = self.metadata.listdir(path) if stat.S_ISDIR(st.st_mode) else None
+                info = fs_core.details(path, st, listing)
+                if info['type'] == 'file':
                     messagebox.showinfo("File Details", 
-                                      f"Path: {path}\nSize: {size:,} bytes\n"
-                                      f"Created: {formatted_created}\n"
-                                      f"Modified: {formatted_mod}", parent=self.root)
-                elif os.path.isdir(path):
-                    num_files = len([name for name in os.listdir(path) if os.path.isfile(os.path.join(path, name))])
-                    num_dirs = len([name for name in os.listdir(path) if os.path.isdir(os.path.join(path, name))])
-                    mod_time = os.path.getmtime(path)
-                    formatted_mod = datetime.fromtimestamp(mod_time).strftime('%Y-%m-%d %H:%M:%S')
-                    messagebox.showinfo("Directory Details", 
-                                      f"Path: {path}\n"
-                                      f"Contents: {num_files} files, {num_dirs} subdirectories\n"
-                                      f"Modified: {formatted_mod}", parent=self.root)
+                                      f"Path: {path}\nSize: {info['size']:,} bytes\n"
+                                      f"Created: {fs_core.format_time(info['created'])}\n"
+                                      f"Modified: {fs_core.format_time(info['modified'])}", parent=self.root)
+                elif info['type'] == 'directory':
+                    self.show_directory_details(path,
+                                                f"Path: {path}\n"
+                                                f"Contents: {info['files']} files, {info['dirs']} subdirectories\n"
+                                                f"Modified: {fs_core.format_time(info['modified'])}")
             except Exception as e:
                 messagebox.showerror("Error", str(e), parent=self.root)
+            self.update_cache_status()
+
+    def show_directory_details(self, path, summary):
+        """Details window whose recursive size streams in while du runs"""
+        window = tk.Toplevel(self.root)
+        window.title("Directory Details")
+        window.configure(background=self.colors['background'])
+        window.transient(self.root)
+        label = ttk.Label(window, text=summary, justify=tk.LEFT, padding=15)
+        label.pack(fill=tk.BOTH, expand=True)
+        ttk.Button(window, text="Close", command=window.destroy).pack(pady=(0, 10))
+        cancelled = threading.Event()
+        window.bind('<Destroy>', lambda e: cancelled.set() if e.widget is window else None)
+
+        def show(usage, done):
+            if not window.winfo_exists():
+                return
+            text = (f"{summary}\n\nTotal size: {format_size(usage.bytes)} ({usage.bytes:,} bytes)\n"
+                    f"On disk: {format_size(usage.disk_bytes)}\n"
+                    f"Recursive: {usage.files:,} files in {usage.dirs:,} directories")
+            if usage.errors:
+                text += f"\nUnreadable: {usage.errors:,}"
+            label.config(text=text if done else text + "\n\nScanning…")
+            if done:
+                self.show_directory_sizes(path)
+
+        def measure():
+            usage = self.disk_usage.measure(path, lambda partial: self.ui.post(show, partial, False), cancelled)
+            if usage is not None:
+                self.ui.post(show, usage, True)
+
+        label.config(text=summary + "\n\nScanning…")
+        threading.Thread(target=measure, name='du', daemon=True).start()
 
     def show_permissions(self):
         path = self.get_selected_path()
         if path:
             try:
-                stat_info = os.stat(path)
-                mode = stat_info.st_mode
-                perms = {
-                    'Owner': {
-                        'Read': bool(mode & stat.S_IRUSR),
-                        'Write': bool(mode & stat.S_IWUSR),
-                        'Execute': bool(mode & stat.S_IXUSR)
-                    },
-                    'Group': {
-                        'Read': bool(mode & stat.S_IRGRP),
-                        'Write': bool(mode & stat.S_IWGRP),
-                        'Execute': bool(mode & stat.S_IXGRP)
-                    },
-                    'Others': {
-                        'Read': bool(mode & stat.S_IROTH),
-                        'Write': bool(mode & stat.S_IWOTH),
-                        'Execute': bool(mode & stat.S_IXOTH)
-                    }
-                }
+                perms = fs_core.permissions(self.metadata.stat(path, fresh=True).st_mode)
                 
                 permission_str = "🔐 Permissions:\n\n"
                 for category, rights in perms.items():
@@ -397,53 +1356,116 @@ class FileSystemExplorerApp:
                 messagebox.showinfo("Permissions", permission_str, parent=self.root)
             except Exception as e:
                 messagebox.showerror("Error", str(e), parent=self.root)
+            self.update_cache_status()
 
     def modify_permissions(self):
         path = self.get_selected_path()
         if path:
-            options = {
-                '1': ("Read Only", stat.S_IRUSR),
-                '2': ("Write Only", stat.S_IWUSR),
-                '3': ("Execute Only", stat.S_IXUSR),
-                '4': ("Read + Write", stat.S_IRUSR | stat.S_IWUSR),
-                '5': ("Read + Execute", stat.S_IRUSR | stat.S_IXUSR),
-                '6': ("Full Control", stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
-            }
-            
             choice = simpledialog.askstring("Modify Permissions", 
-                                          "Choose permission level:\n\n"
-                                          "1. Read Only\n"
-                                          "2. Write Only\n"
-                                          "3. Execute Only\n"
-                                          "4. Read + Write\n"
-                                          "5. Read + Execute\n"
-                                          "6. Full Control",
+                                          "Choose permission level:\n\n" +
+                                          "\n".join(f"{key}. {label}"
+                                                    for key, (label, _) in fs_core.PERMISSION_LEVELS.items()),
                                           parent=self.root)
             
-            if choice in options:
+            if choice in fs_core.PERMISSION_LEVELS:
                 try:
-                    os.chmod(path, options[choice][1])
+                    label = fs_core.set_permissions(path, choice)
+                    self.metadata.invalidate(path)
                     messagebox.showinfo("Success", 
-                                      f"Permissions set to: {options[choice][0]}", 
+                                      f"Permissions set to: {label}", 
                                       parent=self.root)
                 except Exception as e:
                     messagebox.showerror("Error", str(e), parent=self.root)
 
     # === Storage Functions ===
+    def open_default_volume(self):
+        """Open the volume kept between sessions, or an in-memory one when its
+        file can't be used (e.g. another window has it open)"""
+        # Worker thread: a volume not checkpointed before a crash is scanned
+        path = default_volume_path()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            storage = PersistentStorageAllocator(path, None if os.path.exists(path) else DEFAULT_VOLUME_BLOCKS)
+        except (OSError, ValueError):
+            storage = StorageAllocator(DEFAULT_VOLUME_BLOCKS)
+        self.ui.post(self.use_storage, storage)
+
+    def open_volume(self):
+        path = filedialog.asksaveasfilename(parent=self.root, title="Open or Create Volume",
+                                            defaultextension='.alloc', confirmoverwrite=False,
+                                            filetypes=[("Allocator volumes", "*.alloc"), ("All files", "*")])
+        if not path or path == getattr(self.storage, 'path', None):
+            return
+        size = None
+        if not os.path.exists(path):
+            size = simpledialog.askinteger("New Volume", "Number of blocks:", minvalue=1, parent=self.root)
+            if not size:
+                return
+        self.log_storage(f"📂 Opening {path}…", 'header')
+        threading.Thread(target=self.load_volume, args=(path, size), name='open-volume', daemon=True).start()
+
+    def load_volume(self, path, size):
+        # Worker thread: never touch Tk here
+        try:
+            storage = PersistentStorageAllocator(path, size)
+        except (OSError, ValueError) as e:
+            message = str(e)
+            self.ui.post(lambda: messagebox.showerror("Error", message, parent=self.root))
+            return
+        self.ui.post(self.use_storage, storage)
+
+    def use_storage(self, storage):
+        """Switch to `storage`, opened on a worker thread"""
+        self.close_storage()
+        self.storage = storage
+        if not self.storage_tab.winfo_children():
+            self.on_tab_changed()  # build the tab if it is waiting for the volume
+            return
+        self.storage_map.storage = storage
+        self.strategy_var.set(storage.strategy.name)
+        self.storage_title.config(text=f"💾 Storage Allocation ({storage.strategy.name})")
+        if isinstance(storage, PersistentStorageAllocator):
+            self.log_storage(f"📂 Opened {storage.path}: {storage.used:,} of {storage.size:,} blocks used",
+                             'header')
+        self.storage_map.fit()
+
+    def close_storage(self):
+        if isinstance(self.storage, PersistentStorageAllocator):
+            self.storage.close()
+
+    def schedule_checkpoint(self):
+        """Checkpoint a persistent volume once changes to it pause, so a
+        crash after that reopens it without scanning its bitmap"""
+        if self.checkpoint_after is not None:
+            self.root.after_cancel(self.checkpoint_after)
+        self.checkpoint_after = self.root.after(CHECKPOINT_DELAY_MS, self.checkpoint_storage)
+
+    def checkpoint_storage(self):
+        self.checkpoint_after = None
+        if isinstance(self.storage, PersistentStorageAllocator):
+            self.storage.checkpoint(CHECKPOINT_MAX_EXTENTS)
+
     def allocate_blocks(self):
         size = simpledialog.askinteger("Allocate Blocks", 
                                      "Number of blocks to allocate:",
                                      minvalue=1, maxvalue=self.storage.size,
                                      parent=self.root)
         if size:
-            start = self.storage.first_fit_allocate(size)
+            start = self.storage.allocate(size)
             if start != -1:
-                self.storage_output.insert('end', f"✅ Allocated blocks {start} to {start + size - 1}\n")
-                self.storage_output.tag_config('success', foreground=self.colors['success'])
-                self.storage_output.tag_add('success', 'end-1l linestart', 'end-1l lineend')
+                end = start + self.storage.reserved_size(size) - 1
+                self.log_storage(f"✅ Allocated blocks {start} to {end}", 'success')
+                self.storage_map.refresh()
+                self.schedule_checkpoint()
             else:
                 messagebox.showerror("Error", "Not enough contiguous free blocks.", parent=self.root)
 
+    def change_strategy(self, event=None):
+        name = self.strategy_var.get()
+        self.storage.set_strategy(name)
+        self.storage_title.config(text=f"💾 Storage Allocation ({name})")
+        self.log_storage(f"🔀 Placement strategy: {name}", 'header')
+
     def deallocate_blocks(self):
         start = simpledialog.askinteger("Deallocate Blocks", 
                                       "Starting block number:",
@@ -456,23 +1478,39 @@ class FileSystemExplorerApp:
                                           parent=self.root)
             if size is not None:
                 self.storage.deallocate(start, size)
-                self.storage_output.insert('end', f"🗑️ Deallocated blocks {start} to {start + size - 1}\n")
-                self.storage_output.tag_config('warning', foreground=self.colors['warning'])
-                self.storage_output.tag_add('warning', 'end-1l linestart', 'end-1l lineend')
+                self.log_storage(f"🗑️ Deallocated blocks {start} to {start + size - 1}", 'warning')
+                self.storage_map.refresh()
+                self.schedule_checkpoint()
 
     def show_storage_map(self):
-        self.storage_output.insert('end', "\n📊 Storage Allocation Map:\n")
-        self.storage_output.tag_config('header', foreground=self.colors['accent'])
-        self.storage_output.tag_add('header', 'end-1l linestart', 'end-1l lineend')
-        
-        map_str = self.storage.get_allocation_map()
-        formatted = '\n'.join([f"{i*20:3d}: {map_str[i*20:(i+1)*20]}" 
-                             for i in range(0, (len(map_str)+19)//20)])
-        
-        self.storage_output.insert('end', formatted + '\n\n')
-        self.storage_output.see("end")
+        """Zoom the map out to the whole volume"""
+        self.storage_map.fit()
+
+    def log_storage(self, text, tag):
+        """Append a coloured line to the storage log, keeping the last STORAGE_LOG_LINES"""
+        colors = {'success': 'success', 'warning': 'warning', 'header': 'accent'}
+        self.storage_output.insert('end', text + '\n')
+        self.storage_output.tag_config(tag, foreground=self.colors[colors[tag]])
+        self.storage_output.tag_add(tag, 'end-2l linestart', 'end-2l lineend')
+        excess = int(self.storage_output.index('end-2l').split('.')[0]) - STORAGE_LOG_LINES
+        if excess > 0:
+            self.storage_output.delete('1.0', f"{excess + 1}.0")
+        self.storage_output.see('end')
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="File System Explorer")
+    parser.add_argument('--measure-startup', action='store_true',
+                        help="print startup timings (including time to first paint) as JSON and exit")
+    args = parser.parse_args()
     root = tk.Tk()
     app = FileSystemExplorerApp(root)
-    root.mainloop()
\ No newline at end of file
+    if args.measure_startup:
+        app.measure_startup()
+    root.mainloop()
+    app.loader.shutdown()
+    app.watcher.close()
+    app.disk_usage.shutdown()
+    app.index_cancelled.set()
+    app.search_pool.shutdown(wait=False, cancel_futures=True)
+    app.close_storage()
+    app.preview.close()
\ No newline at end of file
@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class MetadataCache:
+    """Bounded LRU of stat results and directory listings keyed by path.
+
+    A stat entry stays valid while its parent directory's mtime is unchanged
+    and a listing while its own directory's mtime is. Directory mtimes are
+    re-read at most once per `revalidate` seconds, so repeated lookups in a
+    hot directory cost no syscalls. Writing to or chmod-ing a file in place
+    leaves its directory's mtime alone, so a stat entry is also dropped
+    after `stat_ttl` seconds, and stat(path, fresh=True) skips the cache for
+    views that must be current. The explorer's own create/delete/rename/
+    chmod operations call invalidate() and take effect immediately.
+    """
+
+    def __init__(self, capacity=200_000, revalidate=2.0, stat_ttl=2.0):
+        self.capacity = capacity
+        self.revalidate = revalidate
+        self.stat_ttl = stat_ttl
+        self.entries = OrderedDict()  # key -> (weight, validator mtime, value, stored at)
+        self.weight = 0
+        self.dir_mtimes = {}  # dir -> (mtime_ns, checked at)
+        # dir -> paths directly inside it with an entry or mtime above, so a
+        # subtree can be forgotten without scanning the whole cache
+        self.children = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+
+    def _dir_mtime(self, path):
+        now = time.monotonic()
+        checked = self.dir_mtimes.get(path)
+        if checked is not None and now - checked[1] < self.revalidate:
+            return checked[0]
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if len(self.dir_mtimes) >= self.capacity:
+            self.dir_mtimes.clear()
+            self.children = {}
+            for _, cached_path in self.entries:
+                self._track(cached_path)
+        self.dir_mtimes[path] = (mtime, now)
+        self._track(path)
+        return mtime
+
+    def _track(self, path):
+        parent = os.path.dirname(path)
+        if parent != path:
+            self.children.setdefault(parent, set()).add(path)
+
+    def _untrack(self, path):
+        """Drop `path` from its parent's children once nothing of it or under
+        it is cached, and the parent too if that leaves it empty"""
+        while (path not in self.children and path not in self.dir_mtimes
+               and ('stat', path) not in self.entries and ('list', path) not in self.entries):
+            parent = os.path.dirname(path)
+            siblings = self.children.get(parent)
+            if siblings is None or parent == path:
+                return
+            siblings.discard(path)
+            if siblings:
+                return
+            del self.children[parent]
+            path = parent
+
+    def _lookup(self, key, directory, max_age=None):
+        with self.lock:
+            cached = self.entries.get(key)
+            if cached is not None:
+                if (cached[1] is not None and cached[1] == self._dir_mtime(directory)
+                        and (max_age is None or time.monotonic() - cached[3] < max_age)):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return cached[2]
+                self._drop(key)
+            self.misses += 1
+            # Read the validator before the caller does, so changes made while
+            # it is listing or stat-ing make the stored result stale
+            self._dir_mtime(directory)
+            return None
+
+    def _store(self, key, directory, value, weight=1):
+        if weight > self.capacity:
+            return
+        with self.lock:
+            self._drop(key)
+            self.entries[key] = (weight, self._dir_mtime(directory), value, time.monotonic())
+            self.weight += weight
+            self._track(key[1])
+            while self.weight > self.capacity:
+                (_, path), (dropped, *_) = self.entries.popitem(last=False)
+                self.weight -= dropped
+                self._untrack(path)
+
+    def _drop(self, key):
+        cached = self.entries.pop(key, None)
+        if cached is not None:
+            self.weight -= cached[0]
+            self._untrack(key[1])
+
+    def stat(self, path, fresh=False):
+        """os.stat(path), from the cache while the parent directory is unchanged
+        and the entry is under stat_ttl seconds old, unless `fresh`"""
+        key = ('stat', path)
+        parent = os.path.dirname(path)
+        st = None if fresh else self._lookup(key, parent, self.stat_ttl)
+        if st is None:
+            st = os.stat(path)
+            self._store(key, parent, st)
+        return st
+
+    def listing(self, path):
+        """[(name, is_dir, is_file)] for `path`, or None if not cached or stale"""
+        return self._lookup(('list', path), path)
+
+    def store_listing(self, path, entries):
+        self._store(('list', path), path, entries, 1 + len(entries))
+
+    def listdir(self, path):
+        entries = self.listing(path)
+        if entries is None:
+            entries = scan_listing(path)
+            self.store_listing(path, entries)
+        return entries
+
+    def invalidate(self, path, recursive=False):
+        """Forget `path`, its listing and its parent's, after changing it
+        ourselves; with `recursive`, everything cached under it too. Costs
+        O(entries forgotten), not O(cache size)."""
+        parent = os.path.dirname(path)
+        with self.lock:
+            self._drop(('list', parent))
+            if self.dir_mtimes.pop(parent, None) is not None:
+                self._untrack(parent)
+            pending = [path]
+            while pending:
+                current = pending.pop()
+                self._drop(('stat', current))
+                self._drop(('list', current))
+                self.dir_mtimes.pop(current, None)
+                if recursive:
+                    pending.extend(self.children.pop(current, ()))
+                self._untrack(current)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self.entries),
+                'weight': self.weight,
+            }
+
+
+def _entry_types(entry):
+    try:
+        return entry.is_dir(), entry.is_file()
+    except OSError:
+        return False, False
+
+
+def iter_listing(path):
+    """Yield (name, is_dir, is_file) using the types scandir already read"""
+    with os.scandir(path) as it:
+        for entry in it:
+            yield (entry.name,) + _entry_types(entry)
+
+
+def scan_listing(path):
+    return list(iter_listing(path))
@@ -0,0 +1,245 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from fs_core import cache_dir
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    dir INTEGER NOT NULL,
+    name TEXT NOT NULL COLLATE NOCASE,
+    is_dir INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_dir ON entries(dir);
+CREATE INDEX IF NOT EXISTS entries_name ON entries(name);
+CREATE VIRTUAL TABLE IF NOT EXISTS names USING fts5(
+    name, content='entries', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+    INSERT INTO names(rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+    INSERT INTO names(names, rowid, name) VALUES ('delete', old.id, old.name);
+END;
+"""
+
+SEARCH_MODES = ('substring', 'prefix', 'glob')
+# PRAGMA user_version while a first build runs without the name index
+_BULK_BUILD = 1
+
+
+def _encode(name):
+    """`name` as stored: a name that isn't valid UTF-8 (one os.scandir gave
+    lone surrogates for) can't be bound as text, so it goes in as its bytes"""
+    try:
+        name.encode('utf-8')
+    except UnicodeEncodeError:
+        return os.fsencode(name)
+    return name
+
+
+def _decode(value):
+    return os.fsdecode(value) if isinstance(value, bytes) else value
+
+
+def default_index_path(root):
+    digest = hashlib.sha1(os.fsencode(root)).hexdigest()[:16]
+    return cache_dir(f'index-{digest}.sqlite3')
+
+
+def _scan(path, known_mtime):
+    """Worker: (mtime, [(name, is_dir)]), with None entries if `path` is
+    unchanged since it was indexed, or (None, None) if it is gone"""
+    try:
+        mtime = os.stat(path, follow_symlinks=False).st_mtime_ns
+        if mtime == known_mtime:
+            return mtime, None
+        entries = []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    is_dir = False
+                entries.append((entry.name, is_dir))
+        return mtime, entries
+    except OSError:
+        return None, None
+
+
+class PathIndex:
+    """On-disk index of every path under `root`, in SQLite with an FTS5
+    trigram table over the names, so substring, prefix and glob searches
+    don't walk the file system.
+
+    refresh() scans in parallel, one task per directory, and on later runs
+    only re-lists directories whose mtime changed since they were indexed.
+    Each thread gets its own connection; WAL lets searches run while a
+    refresh is writing.
+    """
+
+    def __init__(self, root, db_path=None, workers=8):
+        self.root = os.path.abspath(root)
+        self.db_path = db_path or default_index_path(self.root)
+        self.workers = workers
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        self._db().executescript(SCHEMA)
+
+    def _db(self):
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self.local.db = db
+        return db
+
+    def close(self):
+        db = getattr(self.local, 'db', None)
+        if db is not None:
+            db.close()
+            self.local.db = None
+
+    def count(self):
+        return self._db().execute('SELECT count(*) FROM entries').fetchone()[0]
+
+    # === Building ===
+    def refresh(self, on_progress=None, cancelled=None, commit_interval=0.5):
+        """Bring the index up to date; returns the number of directories
+        re-listed. on_progress(dirs visited, dirs re-listed) runs on this thread."""
+        db = self._db()
+        if db.execute('PRAGMA user_version').fetchone()[0] == _BULK_BUILD:
+            self._finish_bulk_build(db)  # a first build was cut short
+        known = {_decode(path): mtime for path, mtime in db.execute('SELECT path, mtime FROM dirs')}
+        if not known:
+            # First build: fill the tables bare and index the names once at
+            # the end, several times faster than per-row trigger updates.
+            # The flag, committed first, has the next refresh finish the job
+            # if this process dies before then.
+            db.executescript(f'PRAGMA user_version = {_BULK_BUILD}; '
+                             'DROP TRIGGER entries_ai; DROP INDEX entries_name;')
+        try:
+            return self._refresh(db, known, on_progress, cancelled, commit_interval)
+        finally:
+            if not known:
+                self._finish_bulk_build(db)
+
+    def _finish_bulk_build(self, db):
+        """Put back the trigger and index dropped for a first build and fill
+        the name table from the entries"""
+        db.commit()
+        db.executescript(SCHEMA)
+        db.execute("INSERT INTO names(names) VALUES ('rebuild')")
+        db.execute('PRAGMA user_version = 0')
+        db.commit()
+
+    def _refresh(self, db, known, on_progress, cancelled, commit_interval):
+        visited = relisted = 0
+        last_commit = time.monotonic()
+        with ThreadPoolExecutor(self.workers, thread_name_prefix='path-index') as pool:
+            futures = {pool.submit(_scan, self.root, known.get(self.root)): self.root}
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                if cancelled is not None and cancelled.is_set():
+                    for future in futures:
+                        future.cancel()
+                    break
+                for future in done:
+                    path = futures.pop(future)
+                    mtime, entries = future.result()
+                    visited += 1
+                    if mtime is None:
+                        self._forget_tree(db, path)
+                        continue
+                    if entries is None:
+                        subdirs = [_decode(name) for (name,) in db.execute(
+                            'SELECT e.name FROM entries e JOIN dirs d ON d.id = e.dir '
+                            'WHERE d.path = ? AND e.is_dir', (_encode(path),))]
+                    else:
+                        relisted += 1
+                        subdirs = self._store(db, path, mtime, entries)
+                    for name in subdirs:
+                        child = os.path.join(path, name)
+                        futures[pool.submit(_scan, child, known.get(child))] = child
+                if time.monotonic() - last_commit >= commit_interval:
+                    db.commit()
+                    last_commit = time.monotonic()
+                    if on_progress is not None:
+                        on_progress(visited, relisted)
+        db.commit()
+        if on_progress is not None:
+            on_progress(visited, relisted)
+        return relisted
+
+    def _store(self, db, path, mtime, entries):
+        row = db.execute('SELECT id FROM dirs WHERE path = ?', (_encode(path),)).fetchone()
+        if row is None:
+            dir_id = db.execute('INSERT INTO dirs(path, mtime) VALUES (?, ?)', (_encode(path), mtime)).lastrowid
+            old = {}
+        else:
+            dir_id = row[0]
+            db.execute('UPDATE dirs SET mtime = ? WHERE id = ?', (mtime, dir_id))
+            old = {_decode(name): (entry_id, bool(is_dir)) for entry_id, name, is_dir in db.execute(
+                'SELECT id, name, is_dir FROM entries WHERE dir = ?', (dir_id,))}
+        current = dict(entries)
+        gone = []
+        for name, (entry_id, was_dir) in old.items():
+            if current.get(name) is not was_dir:
+                gone.append((entry_id,))
+                if was_dir:
+                    self._forget_tree(db, os.path.join(path, name))
+        db.executemany('DELETE FROM entries WHERE id = ?', gone)
+        db.executemany('INSERT INTO entries(dir, name, is_dir) VALUES (?, ?, ?)',
+                       [(dir_id, _encode(name), is_dir) for name, is_dir in entries
+                        if name not in old or old[name][1] is not is_dir])
+        return [name for name, is_dir in entries if is_dir]
+
+    def _forget_tree(self, db, path):
+        prefix = os.path.join(path, '')
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        # Paths below it stored as bytes sort apart from the text ones
+        raw_prefix = os.fsencode(prefix)
+        raw_upper = raw_prefix[:-1] + bytes([raw_prefix[-1] + 1])
+        ids = [(dir_id,) for (dir_id,) in db.execute(
+            'SELECT id FROM dirs WHERE path = ? OR (path >= ? AND path < ?) OR (path >= ? AND path < ?)',
+            (_encode(path), _encode(prefix), _encode(upper), raw_prefix, raw_upper))]
+        db.executemany('DELETE FROM entries WHERE dir = ?', ids)
+        db.executemany('DELETE FROM dirs WHERE id = ?', ids)
+
+    # === Searching ===
+    def search(self, text, mode='substring', limit=200):
+        """[(path, is_dir)] of entries whose name matches `text`, case-insensitively
+        for substring and prefix, case-sensitively for glob"""
+        if not text:
+            return []
+        select = 'SELECT d.path, e.name, e.is_dir FROM entries e JOIN dirs d ON d.id = e.dir '
+        if mode == 'prefix':
+            query = select + 'WHERE e.name >= ? AND e.name < ? ORDER BY e.name LIMIT ?'
+            args = (text, text + '\U0010ffff', limit)
+        elif mode == 'glob':
+            query = (select + 'JOIN names ON names.rowid = e.id '
+                     'WHERE names.name GLOB ? LIMIT ?')
+            args = (text, limit)
+        elif mode == 'substring' and len(text) >= 3:
+            # A quoted phrase of trigrams matches exactly the names containing it
+            query = select + 'JOIN names ON names.rowid = e.id WHERE names MATCH ? LIMIT ?'
+            args = ('"' + text.replace('"', '""') + '"', limit)
+        elif mode == 'substring':
+            # Too short for a trigram: scan the names
+            escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            query = select + "WHERE e.name LIKE ? ESCAPE '\\' LIMIT ?"
+            args = (f'%{escaped}%', limit)
+        else:
+            raise ValueError(f"unknown search mode {mode!r}")
+        return [(os.path.join(_decode(path), _decode(name)), bool(is_dir))
+                for path, name, is_dir in self._db().execute(query, args)]
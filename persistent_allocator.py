@@ -0,0 +1,220 @@
+import mmap
+import os
+import struct
+
+from allocator import STRATEGIES, FirstFit, StorageAllocator, _fill, _runs
+from fs_core import cache_dir
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks
+    fcntl = None
+
+MAGIC = b'FSEALLOC'
+VERSION = 1
+# The header gets a page of its own so the block map starts page-aligned
+HEADER_SIZE = 4096
+
+# magic, version, clean, size, used, generation, table_offset, table_count, strategy
+_HEADER = struct.Struct('<8sIIQQQQQ16s')
+# state, value, start, end, used_after
+_JOURNAL = struct.Struct('<IIQQQ')
+_JOURNAL_OFFSET = 128
+_EXTENT = struct.Struct('<QQ')
+
+_IDLE, _PENDING = 0, 1
+
+
+def default_volume_path():
+    return cache_dir('volume.alloc')
+
+
+def _read_at(fd, size, offset):
+    # os.pread/pwrite are POSIX-only; the descriptor isn't shared between threads
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, size)
+
+
+def _write_at(fd, data, offset):
+    os.lseek(fd, offset, os.SEEK_SET)
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+class PersistentStorageAllocator(StorageAllocator):
+    """StorageAllocator whose block map lives in a memory-mapped file, so a
+    volume survives restarts.
+
+    File layout: a header page, the block bitmap, then a snapshot of the
+    strategy's free extents written by checkpoint() and close(). The bitmap
+    is used in place through the mapping and is created sparse, so a new
+    volume of billions of blocks costs nothing up front and pages in as it
+    is touched. The header is marked clean while the snapshot matches the
+    bitmap, and reopening a clean volume, even one never closed, seeds the
+    strategy from the snapshot; a volume that changed after its last
+    checkpoint has its bitmap scanned once instead.
+
+    Every change is journaled in the header before it touches the bitmap and
+    redone on the next open if it did not finish. Writes reach the OS page
+    cache at once, which survives the process dying; pass sync=True to also
+    flush each change to disk against power loss, at the cost of speed.
+    """
+
+    def __init__(self, path, size=None, strategy=None, sync=False):
+        self.path = path
+        self.sync = sync
+        self.changes = []
+        self.map = None
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise OSError(f"volume is open in another process: {path}") from None
+            if os.fstat(fd).st_size:
+                saved = self._open(fd, size)
+            else:
+                saved = self._create(fd, size)
+        except BaseException:
+            self._release()
+            os.close(fd)
+            raise
+        self.fd = fd
+        self._saved_free = saved
+        self.set_strategy(strategy or self.strategy_name)
+
+    def _map(self, fd, size):
+        self.size = size
+        nbytes = (size + 7) >> 3
+        self.map = mmap.mmap(fd, HEADER_SIZE + nbytes)
+        view = memoryview(self.map)
+        self.bitmap = view[HEADER_SIZE:HEADER_SIZE + nbytes]
+        view.release()
+
+    def _create(self, fd, size):
+        if size is None or size <= 0:
+            raise ValueError("a new volume needs a size in blocks")
+        os.ftruncate(fd, HEADER_SIZE + ((size + 7) >> 3))  # sparse: all blocks free
+        self._map(fd, size)
+        self.used = self.generation = 0
+        self.strategy_name = FirstFit.name
+        self.clean, self.snapshot = False, (0, 0)
+        return [(0, size)]
+
+    def _open(self, fd, size):
+        header = _read_at(fd, HEADER_SIZE, 0)
+        if len(header) < HEADER_SIZE or header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"not an allocator volume: {self.path}")
+        (_, version, clean, stored_size, self.used, self.generation, table_offset,
+         table_count, strategy) = _HEADER.unpack_from(header)
+        if version != VERSION:
+            raise ValueError(f"unsupported volume version {version}: {self.path}")
+        if size is not None and size != stored_size:
+            raise ValueError(f"volume holds {stored_size} blocks, not {size}: {self.path}")
+        self.clean, self.snapshot = False, (0, 0)
+        self.strategy_name = strategy.rstrip(b'\0').decode()
+        if self.strategy_name not in STRATEGIES:
+            self.strategy_name = FirstFit.name
+        self._map(fd, stored_size)
+
+        state, value, start, end, used_after = _JOURNAL.unpack_from(header, _JOURNAL_OFFSET)
+        if state == _PENDING:
+            # Interrupted mid-change: redo it, filling is idempotent
+            _fill(self.bitmap, start, end, bool(value))
+            self.used = used_after
+            clean = False
+        if clean:
+            table = _read_at(fd, table_count * _EXTENT.size, table_offset)
+            if len(table) == table_count * _EXTENT.size:
+                self.clean, self.snapshot = True, (table_offset, table_count)
+                return list(_EXTENT.iter_unpack(table))
+        # Dirty or truncated snapshot: rebuild from the bitmap
+        free = list(_runs(self.bitmap, 0, self.size, False))
+        self.used = self.size - sum(length for _, length in free)
+        return free
+
+    def set_strategy(self, name):
+        saved, self._saved_free = self._saved_free, None
+        if saved is None:
+            super().set_strategy(name)
+        else:
+            self._seed(name, saved)
+        self.strategy_name = name
+        self._write_header(self.clean)  # the snapshot holds for any strategy
+
+    def _write_header(self, clean):
+        self.clean = clean
+        table_offset, table_count = self.snapshot if clean else (0, 0)
+        _HEADER.pack_into(self.map, 0, MAGIC, VERSION, int(clean), self.size, self.used,
+                          self.generation, table_offset, table_count, self.strategy_name.encode())
+
+    def _flush(self, start, end):
+        """Flush [start, end) bytes of the mapping, widened to whole pages"""
+        start -= start % mmap.PAGESIZE
+        self.map.flush(start, min(end, len(self.map)) - start)
+
+    def _set_blocks(self, start, end, value, used):
+        _JOURNAL.pack_into(self.map, _JOURNAL_OFFSET, _PENDING, int(value), start, end, used)
+        if self.sync:
+            self._flush(0, HEADER_SIZE)
+        super()._set_blocks(start, end, value, used)
+        self._write_header(clean=False)
+        if self.sync:
+            self._flush(HEADER_SIZE + (start >> 3), HEADER_SIZE + ((end + 7) >> 3))
+        _JOURNAL.pack_into(self.map, _JOURNAL_OFFSET, _IDLE, 0, 0, 0, 0)
+        if self.sync:
+            self._flush(0, HEADER_SIZE)
+
+    def checkpoint(self, max_extents=None):
+        """Save the free-extent snapshot and mark the volume clean, if it
+        changed since the last checkpoint. Until the next change, a crash
+        leaves nothing to scan on reopening. Returns False, doing nothing,
+        when the free space is in more than `max_extents` pieces, which lets
+        a caller bound the time it takes."""
+        if self.map is None or self.clean:
+            return True
+        if max_extents is not None and self.strategy.extent_count() > max_extents:
+            return False
+        self._save_snapshot()
+        return True
+
+    def _save_snapshot(self):
+        # The header stays dirty until the new table is complete
+        table_offset = HEADER_SIZE + len(self.bitmap)
+        table = b''.join(_EXTENT.pack(start, length) for start, length in self.strategy.free_extents())
+        _write_at(self.fd, table, table_offset)
+        if self.sync:
+            os.fsync(self.fd)
+        self.generation += 1
+        self.snapshot = (table_offset, len(table) // _EXTENT.size)
+        self._write_header(True)
+        if self.sync:
+            self._flush(0, HEADER_SIZE)
+
+    def close(self):
+        """Save the free-extent snapshot, mark the volume clean and unmap it"""
+        if self.map is None:
+            return
+        if not self.clean:
+            self._save_snapshot()
+        table_offset, table_count = self.snapshot
+        self.map.flush()
+        self._release()
+        # Shrinking a file that is still mapped fails on Windows
+        os.ftruncate(self.fd, table_offset + table_count * _EXTENT.size)
+        os.close(self.fd)
+
+    def _release(self):
+        if self.map is not None:
+            if getattr(self, 'bitmap', None) is not None:
+                self.bitmap.release()
+            self.map.close()
+        self.map = self.bitmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
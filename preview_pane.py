@@ -0,0 +1,236 @@
+import os
+import threading
+import tkinter as tk
+import tkinter.font as tkfont
+from tkinter import ttk
+
+from disk_usage import format_size
+from file_preview import HEX_WIDTH, FilePreview
+
+
+class PreviewPane(ttk.Frame):
+    """Paged text/hex view of one file, backed by file_preview.FilePreview.
+
+    Only the rows that fit on screen are read and put in the Text widget;
+    the scrollbar maps to byte offsets in the file rather than to the
+    widget's contents. The line index is built on a background thread after
+    a file is shown, its progress posted back through `post` (a UiQueue's),
+    and "Go to" takes a line number once the index reaches it, or a byte
+    offset (0x… or @…) at any time. A file that has only grown, like a log
+    being written, is mapped again at its new size and its index extended
+    rather than rebuilt.
+    """
+
+    def __init__(self, master, colors, post, **kwargs):
+        super().__init__(master, **kwargs)
+        self.colors = colors
+        self.post = post
+        self.preview = None
+        self.cancelled = None  # Event stopping the current file's index thread
+        self.top = 0           # byte offset of the first row on screen
+        self.shown_end = 0     # byte offset just past the last row on screen
+
+        toolbar = ttk.Frame(self)
+        toolbar.grid(row=0, column=0, columnspan=2, sticky="ew", pady=(0, 5))
+        self.mode = tk.StringVar(value='text')
+        for text, value in (("Text", 'text'), ("Hex", 'hex')):
+            ttk.Radiobutton(toolbar, text=text, value=value, variable=self.mode,
+                            command=self.change_mode).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(toolbar, text="▲", width=3, command=lambda: self.scroll(-self.rows)).pack(side=tk.LEFT)
+        ttk.Button(toolbar, text="▼", width=3, command=lambda: self.scroll(self.rows)).pack(side=tk.LEFT, padx=5)
+        self.goto_var = tk.StringVar()
+        goto = ttk.Entry(toolbar, textvariable=self.goto_var, width=14)
+        goto.pack(side=tk.RIGHT)
+        goto.bind('<Return>', lambda e: self.go_to())
+        ttk.Label(toolbar, text="Go to line / 0x offset:").pack(side=tk.RIGHT, padx=5)
+
+        self.font = tkfont.Font(family="Consolas", size=10)
+        self.text = tk.Text(self, wrap=tk.NONE, font=self.font, height=8, background=colors['secondary'],
+                            foreground=colors['text'], insertbackground=colors['text'], borderwidth=0,
+                            state=tk.DISABLED)
+        self.text.grid(row=1, column=0, sticky="nsew")
+        self.scrollbar = ttk.Scrollbar(self, command=self.yview)
+        self.scrollbar.grid(row=1, column=1, sticky="ns")
+        xscroll = ttk.Scrollbar(self, orient=tk.HORIZONTAL, command=self.text.xview)
+        xscroll.grid(row=2, column=0, sticky="ew")
+        self.text.config(xscrollcommand=xscroll.set)
+        self.info = ttk.Label(self, text="Select a file to preview it", foreground=colors['text_secondary'])
+        self.info.grid(row=3, column=0, columnspan=2, sticky="ew", pady=(4, 0))
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        self.text.bind('<Configure>', lambda e: self.render())
+        self.text.bind('<MouseWheel>', lambda e: self.scroll(-3 if e.delta > 0 else 3) or 'break')
+        self.text.bind('<Button-4>', lambda e: self.scroll(-3) or 'break')
+        self.text.bind('<Button-5>', lambda e: self.scroll(3) or 'break')
+        self.text.bind('<Prior>', lambda e: self.scroll(-self.rows) or 'break')
+        self.text.bind('<Next>', lambda e: self.scroll(self.rows) or 'break')
+        self.text.bind('<Control-Home>', lambda e: self.yview('moveto', 0) or 'break')
+        self.text.bind('<Control-End>', lambda e: self.yview('moveto', 1) or 'break')
+
+    @property
+    def rows(self):
+        return max(1, self.text.winfo_height() // self.font.metrics('linespace'))
+
+    @property
+    def path(self):
+        """The file shown, if any"""
+        return self.preview.path if self.preview is not None else None
+
+    # === Opening and closing ===
+    def show(self, path):
+        """Preview `path`, unless it is already shown"""
+        if self.preview is not None and self.preview.path == path:
+            return
+        self.open(path)
+        self.top = 0
+        if self.preview is not None:
+            self.mode.set('hex' if self.preview.is_binary() else 'text')
+            self.render()
+
+    def open(self, path):
+        self.close()
+        try:
+            self.preview = FilePreview(path)
+        except (OSError, ValueError) as e:
+            self.clear(f"Can't preview {os.path.basename(path)}: {e}")
+            return
+        self.cancelled = threading.Event()
+        self.preview.claim_index()
+        self._start_index()
+
+    def _start_index(self):
+        threading.Thread(target=self._index, args=(self.preview, self.cancelled),
+                         name='preview-index', daemon=True).start()
+
+    def clear(self, message=""):
+        self.close()
+        self._set_text("")
+        self.scrollbar.set(0, 1)
+        self.info.config(text=message)
+
+    def close(self):
+        if self.cancelled is not None:
+            self.cancelled.set()
+        if self.preview is not None:
+            self.preview.close()
+        self.preview = self.cancelled = None
+
+    def _index(self, preview, cancelled):
+        # Worker thread: never touch Tk here
+        if preview.build_index(lambda indexed: self.post(self.show_info, preview), cancelled=cancelled):
+            self.post(self.show_info, preview)
+
+    # === Navigation ===
+    def change_mode(self):
+        if self.preview is not None:
+            self.jump(self.top)
+
+    def scroll(self, rows):
+        preview = self.preview
+        if preview is None:
+            return
+        if self.mode.get() == 'hex':
+            self.top = max(0, min(self.top + rows * HEX_WIDTH, self._last_top()))
+        elif rows > 0:
+            lines = preview.lines_from(self.top, rows + 1)
+            self.top = min(lines[-1][0], self._last_top()) if len(lines) > rows else self.top
+        else:
+            self.top = preview.lines_before(self.top, -rows)
+        self.render()
+
+    def jump(self, offset):
+        """Show the row holding byte `offset` at the top, or the last page"""
+        preview = self.preview
+        offset = max(0, min(offset, preview.size))
+        top = preview.line_start(offset) if self.mode.get() == 'text' else offset - offset % HEX_WIDTH
+        self.top = min(top, self._last_top())
+        self.render()
+
+    def _last_top(self):
+        """Top row of the page that ends with the end of the file"""
+        preview = self.preview
+        if self.mode.get() == 'hex':
+            last_row = max(0, preview.size - 1) // HEX_WIDTH * HEX_WIDTH
+            return max(0, last_row - (self.rows - 1) * HEX_WIDTH)
+        return preview.lines_before(preview.line_start(max(0, preview.size - 1)), self.rows - 1)
+
+    def yview(self, *args):
+        """Scrollbar protocol over the whole file, not just the rows shown"""
+        if self.preview is None:
+            return
+        if args[0] == 'moveto':
+            self.jump(int(max(0.0, min(float(args[1]), 1.0)) * self.preview.size))
+        elif args[0] == 'scroll':
+            self.scroll(int(args[1]) * (self.rows if args[2] == 'pages' else 1))
+
+    def go_to(self):
+        """Jump to the line number, or 0x…/@… byte offset, typed into Go to"""
+        preview, target = self.preview, self.goto_var.get().strip().replace(',', '')
+        if preview is None or not target:
+            return
+        try:
+            if target.lower().startswith('0x'):
+                offset = int(target, 16)
+            elif target.startswith('@'):
+                offset = int(target[1:])
+            else:
+                offset = preview.offset_of_line(int(target) - 1)
+                if offset is None:
+                    self.info.config(text=f"Line {int(target):,} is past the end" if preview.line_count is not None
+                                     else f"Line {int(target):,} is not indexed yet, try again shortly")
+                    return
+        except ValueError:
+            self.info.config(text=f"Not a line number or offset: {target}")
+            return
+        self.jump(offset)
+
+    # === Drawing ===
+    def render(self):
+        if self.preview is not None and self.preview.changed():
+            if self.preview.grow():
+                # Appended to, like a log: index just the new part
+                if self.preview.claim_index():
+                    self._start_index()
+            else:
+                self.open(self.preview.path)  # truncated, rewritten or replaced: map it afresh
+                if self.preview is not None:
+                    self.top = min(self.top, self._last_top())
+        preview = self.preview
+        if preview is None:
+            return
+        if self.mode.get() == 'hex':
+            rows = preview.hex_rows(self.top, self.rows)
+            self.shown_end = min(self.top + len(rows) * HEX_WIDTH, preview.size)
+        else:
+            lines = preview.lines_from(self.top, self.rows)
+            rows = [data.decode('utf-8', 'replace').rstrip('\r') for _, data in lines]
+            self.shown_end = lines[-1][0] + len(lines[-1][1]) if lines else self.top
+        self._set_text('\n'.join(rows))
+        if preview.size:
+            self.scrollbar.set(self.top / preview.size, self.shown_end / preview.size)
+        else:
+            self.scrollbar.set(0, 1)
+        self.show_info(preview)
+
+    def _set_text(self, text):
+        self.text.config(state=tk.NORMAL)
+        self.text.delete('1.0', tk.END)
+        self.text.insert('1.0', text)
+        self.text.config(state=tk.DISABLED)
+
+    def show_info(self, preview):
+        if preview is not self.preview:
+            return  # progress from a file no longer shown
+        parts = [os.path.basename(preview.path), format_size(preview.size)]
+        if self.mode.get() == 'hex':
+            parts.append(f"bytes 0x{self.top:x}–0x{max(self.top, self.shown_end - 1):x}")
+        else:
+            first, last = preview.line_at(self.top), preview.line_at(max(self.top, self.shown_end - 1))
+            if first is not None and last is not None:
+                parts.append(f"lines {first + 1:,}–{last + 1:,}")
+        if preview.line_count is not None:
+            parts.append(f"{preview.line_count:,} lines")
+        elif preview.size:
+            parts.append(f"indexing lines… {preview.indexed / preview.size:.0%}")
+        self.info.config(text=" · ".join(parts))
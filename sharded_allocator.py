@@ -0,0 +1,224 @@
+import itertools
+import os
+import threading
+
+from allocator import FirstFit, StorageAllocator
+
+# Volumes smaller than this many blocks per shard get fewer shards
+MIN_SHARD_BLOCKS = 1024
+
+
+class _Shard(StorageAllocator):
+    """One slice of a sharded volume, in block numbers local to the slice"""
+
+    def __init__(self, base, size, strategy):
+        super().__init__(size, strategy)
+        self.base = base
+        self.end = base + size
+        self.lock = threading.Lock()
+
+    def claim(self, start, end):
+        """Mark the free blocks [start, end) used without going through the
+        strategy, then reseed the strategy from the bitmap"""
+        self._set_blocks(start, end, True, self.used + end - start)
+        self._seed(self.strategy.name, self.free_runs())
+
+
+class ShardedStorageAllocator:
+    """Thread-safe StorageAllocator: the volume is split into equal shards,
+    each a StorageAllocator with its own lock.
+
+    Each thread has a home shard it allocates from, so threads mostly take
+    different locks; when the home shard can't fit a request the others are
+    tried (ones another thread holds last), and a request no single shard
+    can fit is placed on a free run crossing shard boundaries, with every
+    shard locked. allocate_many()/free_many() take each lock once per batch.
+    Frees and queries take the locks of just the shards they touch.
+    """
+
+    def __init__(self, size=100, strategy=FirstFit.name, shards=None):
+        if shards is None:
+            shards = os.cpu_count() or 1
+        shards = max(1, min(shards, size // MIN_SHARD_BLOCKS))
+        self.size = size
+        self.shard_size = -(-size // shards)
+        self.shards = [_Shard(base, min(self.shard_size, size - base), strategy)
+                       for base in range(0, size, self.shard_size)]
+        self._homes = itertools.count()
+        self._local = threading.local()
+
+    # === Shards ===
+    def _home(self):
+        home = getattr(self._local, 'home', None)
+        if home is None:
+            home = self._local.home = next(self._homes) % len(self.shards)
+        return home
+
+    def _visit(self, attempt):
+        """Call attempt(shard) with the shard locked, home shard first, until
+        it returns True. Shards busy in other threads are left for last."""
+        home, count = self._home(), len(self.shards)
+        busy = []
+        for i in range(count):
+            shard = self.shards[(home + i) % count]
+            if not shard.lock.acquire(blocking=i == 0):
+                busy.append(shard)
+                continue
+            try:
+                if attempt(shard):
+                    return
+            finally:
+                shard.lock.release()
+        for shard in busy:
+            with shard.lock:
+                if attempt(shard):
+                    return
+
+    def _overlapping(self, start, end):
+        """Shards holding any of the blocks [start, end)"""
+        first, last = max(start, 0) // self.shard_size, (min(end, self.size) - 1) // self.shard_size
+        return self.shards[first:last + 1]
+
+    def _local_ranges(self, extents):
+        """{shard: [(local start, size)]} of global (start, size) extents"""
+        ranges = {}
+        for start, size in extents:
+            end = start + size
+            for shard in self._overlapping(start, end):
+                lo, hi = max(start, shard.base), min(end, shard.end)
+                ranges.setdefault(shard, []).append((lo - shard.base, hi - lo))
+        return ranges
+
+    def _lock_all(self):
+        for shard in self.shards:  # always in order, so lockers never deadlock
+            shard.lock.acquire()
+
+    def _unlock_all(self):
+        for shard in self.shards:
+            shard.lock.release()
+
+    # === Allocation ===
+    def allocate(self, size):
+        return self.allocate_many([size])[0]
+
+    first_fit_allocate = allocate
+
+    def allocate_many(self, sizes):
+        """Starts for each of `sizes`, -1 where it failed"""
+        starts = [-1] * len(sizes)
+        pending = [i for i, size in enumerate(sizes) if size > 0]
+
+        def attempt(shard):
+            nonlocal pending
+            failed = []
+            for i, start in zip(pending, shard.allocate_many([sizes[i] for i in pending])):
+                if start == -1:
+                    failed.append(i)
+                else:
+                    starts[i] = shard.base + start
+            pending = failed
+            return not pending
+
+        if pending:
+            self._visit(attempt)
+        for i in pending:
+            starts[i] = self._allocate_across(sizes[i])
+        return starts
+
+    def _allocate_across(self, size):
+        """Place a request on a free run spanning shards, or return -1"""
+        reserved = self.reserved_size(size)
+        if len(self.shards) == 1 or reserved > self.size:
+            return -1
+        self._lock_all()
+        try:
+            for start, length in self.free_runs():
+                if length >= reserved and start // self.shard_size != (start + reserved - 1) // self.shard_size:
+                    break
+            else:
+                return -1
+            end = start + reserved
+            for shard in self._overlapping(start, end):
+                shard.claim(max(start, shard.base) - shard.base, min(end, shard.end) - shard.base)
+            return start
+        finally:
+            self._unlock_all()
+
+    def deallocate(self, start, size):
+        self.free_many([(start, size)])
+
+    def free_many(self, extents):
+        """Free each (start, size), taking each shard's lock once"""
+        for shard, local in self._local_ranges(extents).items():
+            with shard.lock:
+                shard.free_many(local)
+
+    def set_strategy(self, name):
+        self._lock_all()
+        try:
+            for shard in self.shards:
+                shard.set_strategy(name)
+        finally:
+            self._unlock_all()
+
+    # === Queries ===
+    @property
+    def strategy(self):
+        return self.shards[0].strategy
+
+    @property
+    def used(self):
+        return sum(shard.used for shard in self.shards)
+
+    def reserved_size(self, size):
+        return self.shards[0].reserved_size(size)
+
+    def free_blocks(self):
+        return self.size - self.used
+
+    def largest_free_extent(self):
+        """Largest request one shard can place"""
+        return max(shard.largest_free_extent() for shard in self.shards)
+
+    def external_fragmentation(self):
+        free = self.free_blocks()
+        return 1 - self.largest_free_extent() / free if free else 0.0
+
+    def _runs(self, start, end, free):
+        # Unlocked snapshot, for display; runs continuing into the next shard are joined
+        end = self.size if end is None else min(end, self.size)
+        run = None
+        for shard in self._overlapping(start, end):
+            lo, hi = max(start, shard.base) - shard.base, min(end, shard.end) - shard.base
+            for run_start, length in (shard.free_runs if free else shard.used_runs)(lo, hi):
+                run_start += shard.base
+                if run and run[0] + run[1] == run_start:
+                    run = (run[0], run[1] + length)
+                    continue
+                if run:
+                    yield run
+                run = (run_start, length)
+        if run:
+            yield run
+
+    def free_runs(self, start=0, end=None):
+        return self._runs(start, end, True)
+
+    def used_runs(self, start=0, end=None):
+        return self._runs(start, end, False)
+
+    def take_changes(self):
+        changes = []
+        for shard in self.shards:
+            with shard.lock:
+                changes.extend((shard.base + start, shard.base + end) for start, end in shard.take_changes())
+        merged = []
+        for start, end in changes:  # shards are in order and each one's ranges sorted
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    def get_allocation_map(self):
+        return ''.join(shard.get_allocation_map() for shard in self.shards)